@@ -0,0 +1,145 @@
+# *  This Program is free software; you can redistribute it and/or modify
+# *  it under the terms of the GNU General Public License as published by
+# *  the Free Software Foundation; either version 2, or (at your option)
+# *  any later version.
+# *
+# *  This Program is distributed in the hope that it will be useful,
+# *  but WITHOUT ANY WARRANTY; without even the implied warranty of
+# *  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# *  GNU General Public License for more details.
+# *
+# *  You should have received a copy of the GNU General Public License
+# *  along with Kodi; see the file COPYING.  If not, write to
+# *  the Free Software Foundation, 675 Mass Ave, Cambridge, MA 02139, USA.
+# *  http://www.gnu.org/copyleft/gpl.html
+
+# Creates a synthetic sqlite My Pictures Database for the benchmarks.
+#
+#   python benchmarks/generate_db.py --files 100000 --output /tmp/mypicsdb-100k.db
+#
+# Pictures are taken in events (a trip, a party, ...) of a few hours to a few days. Within an
+# event pictures are taken every few minutes, with an occasional burst of pictures taken less than
+# a second apart. Some files are videos or RAW files that the slideshow can not display, and a
+# few have no date. Headline, caption and location tags are shared by the pictures of an event.
+# The same seed always creates the same database.
+
+import argparse
+import calendar
+import os
+import random
+import sqlite3
+import time
+
+SCHEMA = """
+CREATE TABLE Files (idFile INTEGER PRIMARY KEY, idFolder INTEGER, strPath TEXT, strFilename TEXT, ftype TEXT,
+                    DateAdded DATETIME, mtime TEXT, UseIt INTEGER, sha TEXT, Thumb TEXT, ImageRating TEXT,
+                    ImageDateTime DATETIME, UNIQUE (strPath, strFilename));
+CREATE TABLE TagTypes (idTagType INTEGER PRIMARY KEY, TagType TEXT UNIQUE, TagTranslation TEXT, TagShow INTEGER);
+CREATE TABLE TagContents (idTagContent INTEGER PRIMARY KEY, idTagType INTEGER, TagContent TEXT,
+                          UNIQUE (idTagType, TagContent));
+CREATE TABLE TagsInFiles (idTagContent INTEGER, idFile INTEGER, PRIMARY KEY (idTagContent, idFile));
+CREATE INDEX idxTagsInFiles1 ON TagsInFiles (idFile);
+CREATE TABLE FilterWizard (pkFilter INTEGER PRIMARY KEY, strFilterName TEXT UNIQUE, bMatchAll INTEGER,
+                           StartDate TEXT, EndDate TEXT);
+CREATE TABLE FilterWizardItems (pkFilterWizardItems INTEGER PRIMARY KEY, fkFilter INTEGER, strItem TEXT,
+                                nState INTEGER, strTagType TEXT);
+"""
+
+TAG_TYPES = ['Headline', 'Caption/abstract', 'Sub-location', 'City', 'Province/state',
+             'Country/primary location name', 'Keywords', 'Camera model', 'Lens', 'Exposure time']
+# (extension, weight)
+EXTENSIONS = [('jpg', 80), ('JPG', 5), ('png', 3), ('tiff', 1), ('mp4', 5), ('mov', 2), ('cr2', 2), ('nef', 2)]
+# Times are generated in UTC, so the same seed gives the same database in every timezone
+# Rows are written in batches, so a database with millions of files does not have to fit in memory
+BATCH_SIZE = 50000
+FIRST_DATE = calendar.timegm((2005, 1, 1, 0, 0, 0))
+LAST_DATE = calendar.timegm((2024, 12, 31, 0, 0, 0))
+
+def generate(path, file_count, seed=1):
+    rnd = random.Random(seed)
+    if os.path.exists(path):
+        os.remove(path)
+    con = sqlite3.connect(path)
+    con.executescript(SCHEMA)
+    con.executemany("INSERT INTO TagTypes (idTagType, TagType, TagShow) VALUES (?, ?, 1)",
+                    [(number + 1, tag_type) for (number, tag_type) in enumerate(TAG_TYPES)])
+    tag_type_ids = dict((tag_type, number + 1) for (number, tag_type) in enumerate(TAG_TYPES))
+    tag_contents = {}
+
+    def tag_content(tag_type, content):
+        key = (tag_type_ids[tag_type], content)
+        if key not in tag_contents:
+            tag_contents[key] = len(tag_contents) + 1
+        return tag_contents[key]
+
+    extensions = [extension for (extension, weight) in EXTENSIONS for count in range(weight)]
+    cities = ['City %d' %(number) for number in range(300)]
+    files = []
+    tags_in_files = []
+    image_id = 0
+
+    def write_batch():
+        con.executemany("INSERT INTO Files (idFile, strPath, strFilename, ImageDateTime) VALUES (?, ?, ?, ?)", files)
+        con.executemany("INSERT OR IGNORE INTO TagsInFiles (idTagContent, idFile) VALUES (?, ?)", tags_in_files)
+        del files[:]
+        del tags_in_files[:]
+
+    while image_id < file_count:
+        if len(files) >= BATCH_SIZE:
+            write_batch()
+        # A new event
+        event_time = rnd.uniform(FIRST_DATE, LAST_DATE)
+        event_size = min(int(rnd.expovariate(1.0 / 60)) + 1, file_count - image_id)
+        folder = '/pictures/%s/event %d/' %(time.strftime('%Y/%Y-%m-%d', time.gmtime(event_time)), image_id)
+        city = rnd.choice(cities)
+        event_tags = [tag_content('City', city),
+                      tag_content('Province/state', 'State %d' %(cities.index(city) % 40)),
+                      tag_content('Country/primary location name', 'Country %d' %(cities.index(city) % 12))]
+        if rnd.random() < 0.3:
+            event_tags.append(tag_content('Headline', 'Event %d' %(image_id)))
+        if rnd.random() < 0.3:
+            event_tags.append(tag_content('Sub-location', 'Place %d' %(rnd.randrange(2000))))
+        burst_left = 0
+        for number in range(event_size):
+            image_id += 1
+            if burst_left > 0:
+                burst_left -= 1
+                event_time += rnd.choice([0, 0, 1])
+            elif rnd.random() < 0.03:
+                # Start of a burst of pictures
+                burst_left = rnd.randint(5, 40)
+                event_time += rnd.expovariate(1.0 / 120)
+            else:
+                event_time += rnd.expovariate(1.0 / 240)
+            if rnd.random() < 0.01:
+                image_date_time = None
+            else:
+                image_date_time = time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(event_time))
+            filename = 'IMG_%07d.%s' %(image_id, rnd.choice(extensions))
+            files.append((image_id, folder, filename, image_date_time))
+            for content_id in event_tags:
+                tags_in_files.append((content_id, image_id))
+            if rnd.random() < 0.4:
+                tags_in_files.append((tag_content('Caption/abstract', 'Caption %d' %(image_id)), image_id))
+            for keyword in rnd.sample(range(500), rnd.randint(0, 6)):
+                tags_in_files.append((tag_content('Keywords', 'Keyword %d' %(keyword)), image_id))
+            tags_in_files.append((tag_content('Camera model', 'Camera %d' %(image_id % 7)), image_id))
+            tags_in_files.append((tag_content('Exposure time', '1/%d' %(rnd.choice([30, 60, 125, 250, 500]))), image_id))
+    write_batch()
+    con.executemany("INSERT INTO TagContents (idTagContent, idTagType, TagContent) VALUES (?, ?, ?)",
+                    [(content_id, tag_type, content) for ((tag_type, content), content_id) in tag_contents.items()])
+    # A broad and a narrow filter
+    con.execute("INSERT INTO FilterWizard VALUES (1, 'Keyword 7', 0, '', '')")
+    con.execute("INSERT INTO FilterWizardItems VALUES (1, 1, 'Keyword 7', 1, 'Keywords')")
+    con.execute("INSERT INTO FilterWizard VALUES (2, 'City 3', 0, '', '')")
+    con.execute("INSERT INTO FilterWizardItems VALUES (2, 2, 'City 3', 1, 'City')")
+    con.commit()
+    con.close()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Create a synthetic My Pictures Database')
+    parser.add_argument('--files', type=int, default=10000, help='number of files (e.g. 10000, 100000, 1000000)')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', required=True, help='path of the sqlite database to create')
+    arguments = parser.parse_args()
+    generate(arguments.output, arguments.files, arguments.seed)
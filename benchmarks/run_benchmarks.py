@@ -0,0 +1,190 @@
+# *  This Program is free software; you can redistribute it and/or modify
+# *  it under the terms of the GNU General Public License as published by
+# *  the Free Software Foundation; either version 2, or (at your option)
+# *  any later version.
+# *
+# *  This Program is distributed in the hope that it will be useful,
+# *  but WITHOUT ANY WARRANTY; without even the implied warranty of
+# *  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# *  GNU General Public License for more details.
+# *
+# *  You should have received a copy of the GNU General Public License
+# *  along with Kodi; see the file COPYING.  If not, write to
+# *  the Free Software Foundation, 675 Mass Ave, Cambridge, MA 02139, USA.
+# *  http://www.gnu.org/copyleft/gpl.html
+
+# Benchmarks of the screensaver's database work, run outside of Kodi with the stand-in
+# modules in benchmarks/stubs and a database created by benchmarks/generate_db.py.
+#
+#   python benchmarks/generate_db.py --files 100000 --output /tmp/mypicsdb-100k.db
+#   python benchmarks/run_benchmarks.py --database /tmp/mypicsdb-100k.db --output results.json
+#
+# The results are written as JSON, so they can be compared between versions.
+
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+ADDON_DIR = os.path.dirname(BENCHMARKS_DIR)
+
+def load_screensaver(database, profile_dir):
+    # The stand-in MyPicsDB reads the database path when it is imported
+    os.environ['MYPICSDB_PATH'] = database
+    sys.path.insert(0, os.path.join(BENCHMARKS_DIR, 'stubs'))
+    sys.path.insert(0, ADDON_DIR)
+    import xbmcaddon
+    xbmcaddon.PROFILE_PATH = profile_dir
+    from lib import screensaver
+    return screensaver
+
+class Benchmarks(object):
+    def __init__(self, screensaver, repeat, groups, filter_name):
+        self.screensaver = screensaver
+        self.repeat = repeat
+        self.groups = groups
+        self.filter_name = filter_name
+        self.results = {}
+
+    def new_screensaver(self, **settings):
+        # A screensaver with the default settings changed by settings, ready to prepare groups
+        import xbmcaddon
+        saved_settings = dict(xbmcaddon.SETTINGS)
+        xbmcaddon.SETTINGS.update(settings)
+        try:
+            window = self.screensaver.Screensaver()
+            window.db_backend = 'sqlite'
+            window._get_vars()
+            window._get_settings()
+            window._set_ui_components()
+            window._set_image_cache()
+        finally:
+            xbmcaddon.SETTINGS.clear()
+            xbmcaddon.SETTINGS.update(saved_settings)
+        # Count the queries of each benchmark
+        window.timer.enabled = True
+        return window
+
+    def run(self, name, setup, function, operations=1):
+        # Time function(setup()) repeat times, setup is not timed
+        durations = []
+        queries = []
+        for run in range(self.repeat):
+            random.seed(run)
+            state = setup()
+            window = state[0] if isinstance(state, tuple) else state
+            query_count = window.timer.counts.get('query', 0)
+            started = time.perf_counter()
+            function(state)
+            durations.append((time.perf_counter() - started) * 1000.0)
+            queries.append(window.timer.counts.get('query', 0) - query_count)
+        self.results[name] = {'runs': self.repeat,
+                              'operations': operations,
+                              'min_ms': min(durations),
+                              'median_ms': statistics.median(durations),
+                              'mean_ms': statistics.mean(durations),
+                              'median_ms_per_operation': statistics.median(durations) / operations,
+                              'queries_per_operation': statistics.median(queries) / float(operations)}
+        sys.stderr.write('%-32s median %10.2f ms  (%8.3f ms/op, %6.1f queries/op)\n'
+                         %(name, self.results[name]['median_ms'], self.results[name]['median_ms_per_operation'],
+                           self.results[name]['queries_per_operation']))
+
+    def run_all(self):
+        # Dates of all pictures, read from the database and from the selection index
+        self.run('unique_dates', lambda: self.new_screensaver(selectionindex=False),
+                 lambda window: window._get_unique_dates())
+        indexed = self.new_screensaver(selectionindex=True)
+        indexed._load_selection_index()
+        self.run('unique_dates_index', lambda: self.new_screensaver(selectionindex=True),
+                 lambda window: (window._load_selection_index(), window._get_unique_dates()))
+        indexed.selection_index.close()
+
+        # Pictures that match a filter, applied and resolved or loaded from the filter cache
+        filter_settings = {'filter': True, 'filtername': self.filter_name}
+        self.run('filtered_pictures', lambda: self.new_screensaver(filtercache=False, **filter_settings),
+                 lambda window: window._get_filtered_pictures())
+        self.new_screensaver(filtercache=True, **filter_settings)._get_filtered_pictures()
+        self.run('filtered_pictures_cached', lambda: self.new_screensaver(filtercache=True, **filter_settings),
+                 lambda window: window._get_filtered_pictures())
+
+        # Choosing groups of pictures
+        for (name, settings) in [('get_items', {'burst': False, 'selectionindex': False}),
+                                 ('get_items_burst', {'burst': True, 'selectionindex': False}),
+                                 ('get_items_index', {'burst': False, 'selectionindex': True}),
+                                 ('get_items_burst_index', {'burst': True, 'selectionindex': True}),
+                                 ('get_items_filter', dict(filter_settings, burst=False, filtercache=True, selectionindex=False))]:
+            self.run(name, lambda settings=settings: self._with_candidates(self.new_screensaver(**settings)),
+                     lambda window: [window._get_items() for group in range(self.groups)], self.groups)
+
+        # Everything that is displayed with the pictures of each group
+        info_settings = {'tags': True, 'date': True, 'name': 4, 'selectionindex': False}
+        def prepare_groups():
+            window = self._with_candidates(self.new_screensaver(**info_settings))
+            return (window, [window._get_items()[1] for group in range(self.groups)])
+        def set_info_fields(state):
+            (window, picture_groups) = state
+            for picture_group in picture_groups:
+                window._prefetch_tags(picture_group)
+                for picture in picture_group:
+                    window._set_info_fields(window._get_info_fields(picture))
+        self.run('set_info_fields', prepare_groups, set_info_fields, self.groups)
+
+    def _with_candidates(self, window):
+        window._get_candidates()
+        return window
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=ADDON_DIR, stderr=subprocess.DEVNULL).decode('ascii').strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the screensaver outside of Kodi')
+    parser.add_argument('--database', required=True, help='sqlite database created by generate_db.py')
+    parser.add_argument('--repeat', type=int, default=5, help='number of runs of each benchmark')
+    parser.add_argument('--groups', type=int, default=50, help='number of groups chosen in each run')
+    parser.add_argument('--filter', default='Keyword 7', help='name of the filter to benchmark')
+    parser.add_argument('--output', help='file to write the JSON results to, instead of stdout')
+    arguments = parser.parse_args()
+
+    # Work on a copy, the benchmarks must not depend on indexes created by earlier runs
+    work_dir = tempfile.mkdtemp(prefix='groupedpictures-benchmark-')
+    database = os.path.join(work_dir, 'MyPictures.db')
+    shutil.copyfile(arguments.database, database)
+    screensaver = load_screensaver(database, os.path.join(work_dir, 'profile'))
+    connection = sqlite3.connect(database)
+    file_count = connection.execute('SELECT COUNT(*) FROM Files').fetchone()[0]
+    connection.close()
+
+    benchmarks = Benchmarks(screensaver, arguments.repeat, arguments.groups, arguments.filter)
+    try:
+        benchmarks.run_all()
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    results = {'database': os.path.basename(arguments.database),
+               'files': file_count,
+               'revision': git_revision(),
+               'python': platform.python_version(),
+               'platform': platform.platform(),
+               'sqlite': sqlite3.sqlite_version,
+               'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+               'benchmarks': benchmarks.results}
+    if arguments.output:
+        with open(arguments.output, 'w') as output:
+            json.dump(results, output, indent=2, sort_keys=True)
+    else:
+        json.dump(results, sys.stdout, indent=2, sort_keys=True)
+        sys.stdout.write('\n')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,38 @@
+# Stand-in for the MyPicsDB module of script.module.mypicsdb2lib, backed by a sqlite
+# database created by benchmarks/generate_db.py. The database is chosen with DATABASE_PATH.
+
+import os
+import sqlite3
+
+DATABASE_PATH = os.environ.get('MYPICSDB_PATH', '')
+
+class Cursor(object):
+    def __init__(self, connection):
+        self.cursor = connection.cursor()
+
+    def request(self, statement, bindvariables=()):
+        self.cursor.execute(statement, bindvariables)
+        return self.cursor.fetchall()
+
+    def request_with_binds(self, statement, bindvariables):
+        return self.request(statement, bindvariables)
+
+    def close(self):
+        self.cursor.close()
+
+class MyPictureDB(object):
+    def __init__(self):
+        self.con = sqlite3.connect(DATABASE_PATH)
+        self.cur = Cursor(self.con)
+
+    def filterwizard_get_pics_from_filter(self, filtername, limit):
+        # Simplified filter: pictures that have any of the tag contents of the filter items
+        query = " SELECT DISTINCT Files.strPath, Files.strFilename FROM FilterWizard"
+        query += " JOIN FilterWizardItems ON FilterWizardItems.fkFilter = FilterWizard.pkFilter"
+        query += " JOIN TagContents ON TagContents.TagContent = FilterWizardItems.strItem"
+        query += " JOIN TagsInFiles ON TagsInFiles.idTagContent = TagContents.idTagContent"
+        query += " JOIN Files ON Files.idFile = TagsInFiles.idFile"
+        query += " WHERE FilterWizard.strFilterName = ?"
+        if limit > 0:
+            query += " LIMIT %d" %(limit)
+        return self.cur.request(query, (filtername,))
@@ -0,0 +1,38 @@
+# Stand-in for Kodi's xbmc module, so the screensaver can be benchmarked outside of Kodi.
+# Only the parts used by this addon are provided.
+
+import sys
+import time
+
+LOGDEBUG = 0
+LOGINFO = 1
+LOGWARNING = 2
+LOGERROR = 3
+LOGFATAL = 4
+
+# Messages below this level are not printed
+LOG_LEVEL = LOGWARNING
+
+def log(msg, level=LOGDEBUG):
+    if level >= LOG_LEVEL:
+        sys.stderr.write('%s\n' %(msg))
+
+def sleep(milliseconds):
+    time.sleep(milliseconds / 1000.0)
+
+def getSkinDir():
+    return 'skin.estuary'
+
+def executebuiltin(function, wait=False):
+    log('executebuiltin: %s' %(function), LOGINFO)
+
+class Monitor(object):
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def abortRequested(self):
+        return False
+
+    def waitForAbort(self, timeout=0):
+        time.sleep(timeout or 0)
+        return False
@@ -0,0 +1,59 @@
+# Stand-in for Kodi's xbmcaddon module.
+# The settings of this addon start with the defaults from resources/settings.xml,
+# and can be changed through SETTINGS. The settings of other addons come from ADDON_SETTINGS.
+
+import os
+import xml.etree.ElementTree as ET
+
+ADDON_ID = 'screensaver.mypicsdb2.groupedpictures.slideshow'
+ADDON_PATH = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Set to a temporary folder by the benchmark
+PROFILE_PATH = os.path.join(ADDON_PATH, 'benchmarks', 'profile')
+
+def _default_settings():
+    settings = {}
+    tree = ET.ElementTree(file=os.path.join(ADDON_PATH, 'resources', 'settings.xml'))
+    for setting in tree.iter('setting'):
+        default = setting.find('default')
+        value = default.text if default is not None and default.text is not None else ''
+        if setting.get('type') == 'integer':
+            value = int(value)
+        elif setting.get('type') == 'boolean':
+            value = value == 'true'
+        settings[setting.get('id')] = value
+    return settings
+
+SETTINGS = _default_settings()
+ADDON_SETTINGS = {'plugin.image.mypicsdb2': {'db_backend': 'sqlite'}}
+
+class Addon(object):
+    def __init__(self, id=None):
+        self.id = id or ADDON_ID
+
+    def _settings(self):
+        return SETTINGS if self.id == ADDON_ID else ADDON_SETTINGS.get(self.id, {})
+
+    def getSetting(self, id):
+        value = self._settings().get(id, '')
+        if isinstance(value, bool):
+            return 'true' if value else 'false'
+        return str(value)
+
+    def getSettingBool(self, id):
+        return bool(self._settings().get(id, False))
+
+    def getSettingInt(self, id):
+        return int(self._settings().get(id, 0))
+
+    def getSettingString(self, id):
+        return str(self._settings().get(id, ''))
+
+    def getLocalizedString(self, id):
+        return 'String %d %%s' %(id)
+
+    def getAddonInfo(self, id):
+        return {'id': self.id,
+                'name': 'Grouped Pictures Slideshow',
+                'version': 'benchmark',
+                'path': ADDON_PATH,
+                'profile': PROFILE_PATH}.get(id, '')
@@ -0,0 +1,58 @@
+# Stand-in for Kodi's xbmcgui module. Window properties are kept in a dictionary,
+# and image controls only remember the images that were set.
+
+PROPERTIES = {}
+
+def getCurrentWindowDialogId():
+    return 10000
+
+def getScreenWidth():
+    return 1920
+
+def getScreenHeight():
+    return 1080
+
+class Window(object):
+    def __init__(self, existingWindowId=-1):
+        pass
+
+    def setProperty(self, key, value):
+        PROPERTIES[key] = value
+
+    def getProperty(self, key):
+        return PROPERTIES.get(key, '')
+
+    def clearProperty(self, key):
+        PROPERTIES.pop(key, None)
+
+class ControlImage(object):
+    def __init__(self, control_id):
+        self.control_id = control_id
+        self.images = []
+
+    def setImage(self, filename, useCache=True):
+        self.images.append(filename)
+
+    def setVisible(self, visible):
+        pass
+
+    def setAnimations(self, animations):
+        pass
+
+    def setPosition(self, x, y):
+        pass
+
+class WindowXMLDialog(Window):
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def getControl(self, control_id):
+        if not hasattr(self, 'controls'):
+            self.controls = {}
+        return self.controls.setdefault(control_id, ControlImage(control_id))
+
+    def doModal(self):
+        self.onInit()
+
+    def close(self):
+        pass
@@ -0,0 +1,33 @@
+# Stand-in for Kodi's xbmcvfs module, using the local file system.
+
+import os
+
+def translatePath(path):
+    return path
+
+def exists(path):
+    return os.path.exists(path)
+
+def mkdirs(path):
+    os.makedirs(path, exist_ok=True)
+    return True
+
+class Stat(object):
+    def __init__(self, path):
+        self.stat = os.stat(path)
+
+    def st_mtime(self):
+        return int(self.stat.st_mtime)
+
+    def st_size(self):
+        return self.stat.st_size
+
+class File(object):
+    def __init__(self, path, mode='r'):
+        self.file = open(path, 'rb')
+
+    def readBytes(self, numBytes=0):
+        return bytearray(self.file.read(numBytes or -1))
+
+    def close(self):
+        self.file.close()
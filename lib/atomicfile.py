@@ -0,0 +1,41 @@
+# *  This Program is free software; you can redistribute it and/or modify
+# *  it under the terms of the GNU General Public License as published by
+# *  the Free Software Foundation; either version 2, or (at your option)
+# *  any later version.
+# *
+# *  This Program is distributed in the hope that it will be useful,
+# *  but WITHOUT ANY WARRANTY; without even the implied warranty of
+# *  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# *  GNU General Public License for more details.
+# *
+# *  You should have received a copy of the GNU General Public License
+# *  along with Kodi; see the file COPYING.  If not, write to
+# *  the Free Software Foundation, 675 Mass Ave, Cambridge, MA 02139, USA.
+# *  http://www.gnu.org/copyleft/gpl.html
+
+# Files in the addon profile folder are replaced as a whole: they are written to a new temporary file in the
+# same folder, which then replaces the old file in one step. So a reader never sees a partly written file.
+# Every writer gets a temporary file of its own, because the screensaver, its worker threads, the service and
+# the scripts can write the same file at the same time. The last complete file wins.
+
+import contextlib
+import os
+import tempfile
+
+@contextlib.contextmanager
+def replace(path, mode='w'):
+    # Open a temporary file to write the new contents of path to. It replaces path when the with block
+    # finishes, or is removed if the block raises.
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    (handle, temporary) = tempfile.mkstemp(dir=directory, prefix=os.path.basename(path) + '.', suffix='.tmp')
+    try:
+        with os.fdopen(handle, mode) as temporary_file:
+            yield temporary_file
+        os.replace(temporary, path)
+    except BaseException:
+        try:
+            os.remove(temporary)
+        except OSError:
+            pass
+        raise
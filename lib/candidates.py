@@ -0,0 +1,116 @@
+# *  This Program is free software; you can redistribute it and/or modify
+# *  it under the terms of the GNU General Public License as published by
+# *  the Free Software Foundation; either version 2, or (at your option)
+# *  any later version.
+# *
+# *  This Program is distributed in the hope that it will be useful,
+# *  but WITHOUT ANY WARRANTY; without even the implied warranty of
+# *  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# *  GNU General Public License for more details.
+# *
+# *  You should have received a copy of the GNU General Public License
+# *  along with Kodi; see the file COPYING.  If not, write to
+# *  the Free Software Foundation, 675 Mass Ave, Cambridge, MA 02139, USA.
+# *  http://www.gnu.org/copyleft/gpl.html
+
+# The dates or pictures that can start a group, and the random order they are used in.
+# A filter can match more than a million pictures, so the pictures are kept in typed arrays instead
+# of a list of tuples. Instead of shuffling the list each time all of it has been used, the positions
+# are visited in the order of a pseudorandom permutation that is computed one position at a time.
+# Every candidate is still used once before any candidate is used again.
+
+import random
+from array import array
+
+# Number of Feistel rounds of the permutation, enough to look random for a slideshow
+ROUNDS = 6
+
+class Permutation(object):
+    # Pseudorandom one-to-one mapping of range(size) onto itself. A Feistel network mixes the bits of a
+    # position within the smallest power of 4 that holds size, and positions that land outside of
+    # range(size) are mixed again (cycle walking) until they are inside.
+    def __init__(self, size, rnd=random):
+        self.size = size
+        self.half_bits = (max(size - 1, 1).bit_length() + 1) // 2
+        self.mask = (1 << self.half_bits) - 1
+        self.keys = [rnd.getrandbits(32) for number in range(ROUNDS)]
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, position):
+        if not 0 <= position < self.size:
+            raise IndexError('permutation index out of range')
+        value = self._encrypt(position)
+        while value >= self.size:
+            value = self._encrypt(value)
+        return value
+
+    def _encrypt(self, value):
+        (left, right) = (value >> self.half_bits, value & self.mask)
+        for key in self.keys:
+            (left, right) = (right, left ^ self._round(right, key))
+        return (left << self.half_bits) | right
+
+    def _round(self, value, key):
+        # Any function works for a Feistel network, this one spreads every input bit over the output
+        value = ((value ^ key) * 0x9E3779B1) & 0xFFFFFFFF
+        value ^= value >> 15
+        value = (value * 0x85EBCA77) & 0xFFFFFFFF
+        value ^= value >> 13
+        return value & self.mask
+
+class RandomOrder(object):
+    # Positions of range(size) in a random order. Once all of them have been used, a new order is started.
+    def __init__(self, size):
+        self.size = size
+        self._start()
+
+    def _start(self):
+        self.permutation = Permutation(self.size)
+        self.index = 0
+
+    def next(self):
+        position = self.permutation[self.index]
+        self.index += 1
+        if self.index == self.size:
+            # All of the positions have been used, so start over with a new order
+            self._start()
+        return position
+
+class DateCandidates(object):
+    # The unique dates the pictures were taken on, used in a random order
+    def __init__(self, dates):
+        self.dates = list(dates)
+        self.order = RandomOrder(len(self.dates))
+
+    def __len__(self):
+        return len(self.dates)
+
+    def next(self):
+        return self.dates[self.order.next()]
+
+class PictureCandidates(object):
+    # The (idFile, ImageDateTime) of pictures that match a filter, used in a random order.
+    # Only the date of each ImageDateTime is kept, as a number of an entry in a list of the distinct dates.
+    def __init__(self, pictures):
+        self.image_ids = array('q')
+        self.date_numbers = array('i')
+        self.dates = []
+        date_numbers = {}
+        for (image_id, imgdatetime) in pictures:
+            date = imgdatetime[0:10]
+            if date not in date_numbers:
+                date_numbers[date] = len(self.dates)
+                self.dates.append(date)
+            self.image_ids.append(image_id)
+            self.date_numbers.append(date_numbers[date])
+        self.order = RandomOrder(len(self.image_ids))
+
+    def __len__(self):
+        return len(self.image_ids)
+
+    def next(self):
+        # Returns (idFile, date) of the next picture
+        position = self.order.next()
+        return (self.image_ids[position], self.dates[self.date_numbers[position]])
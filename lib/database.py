@@ -0,0 +1,248 @@
+# *  This Program is free software; you can redistribute it and/or modify
+# *  it under the terms of the GNU General Public License as published by
+# *  the Free Software Foundation; either version 2, or (at your option)
+# *  any later version.
+# *
+# *  This Program is distributed in the hope that it will be useful,
+# *  but WITHOUT ANY WARRANTY; without even the implied warranty of
+# *  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# *  GNU General Public License for more details.
+# *
+# *  You should have received a copy of the GNU General Public License
+# *  along with Kodi; see the file COPYING.  If not, write to
+# *  the Free Software Foundation, 675 Mass Ave, Cambridge, MA 02139, USA.
+# *  http://www.gnu.org/copyleft/gpl.html
+
+# Connections to the My Pictures Database, opened on the first query instead of when the addon is imported.
+# Every thread gets its own connections, so the display loop and the worker thread can query at the same time
+# (a sqlite connection can only be used by the thread that opened it).
+#  - sqlite: the screensaver only reads, so queries go through a read-only connection to the database file
+#    of MyPicsDB with pragmas tuned for reading.
+#  - mysql: queries go through the connection of MyPicsDB, which is reopened if it fails, e.g. after the
+#    server closed it for being idle while the screensaver was not running.
+# Queries are run by the name of their statement (see statements.py), with the values bound to its parameters.
+# When a profiler is set, every query is timed and measured by it (see sqlprofiler.py).
+# When interrupted is set, long queries call it between their batches and rows, and end with Interrupted when it
+# returns True, e.g. the service stops rebuilding when Kodi is no longer idle.
+
+import sqlite3
+import threading
+import time
+import urllib.request
+
+import xbmc
+
+import mypicsdb.MypicsDB  as MypicsDB
+
+from lib import sqlprofiler
+from lib import statements
+
+# Pragmas of the read-only sqlite connections
+SQLITE_PRAGMAS = ["PRAGMA query_only = ON",
+                  # Read the database file through memory mapped I/O, up to 256 MB
+                  "PRAGMA mmap_size = 268435456",
+                  # Keep up to 16 MB of pages in memory
+                  "PRAGMA cache_size = -16384",
+                  # Sorting for ORDER BY and DISTINCT is done in memory
+                  "PRAGMA temp_store = MEMORY"]
+
+# Rows read from a streamed query between two calls of interrupted
+INTERRUPT_ROWS = 10000
+
+# Raised by a long query that was stopped because interrupted returned True
+class Interrupted(Exception):
+    pass
+
+class Database(object):
+    def __init__(self, db_backend):
+        self.db_backend = db_backend
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        # Every connection opened by any thread, so they can all be closed when the show stops
+        self.connections = []
+        # Path of the sqlite database file, None until it is known, '' if it can not be opened read-only
+        self.sqlite_path = None
+        # SqlProfiler that measures every query, None when queries are not profiled
+        self.profiler = None
+        # Returns True when the long queries have to stop, None when they always run to the end
+        self.interrupted = None
+
+    def execute(self, name, parameters=()):
+        # Run the statement called name with parameters bound to it, and return all of the rows
+        return self.request(statements.get(name, self.db_backend), parameters)
+
+    def execute_many(self, name, parameter_rows):
+        # Run the statement called name once for each row of parameters, and return all of the rows of all runs.
+        # Like executemany, but for statements that return rows: the statement is only compiled once.
+        query = statements.get(name, self.db_backend)
+        rows = []
+        for parameters in parameter_rows:
+            self._check_interrupted()
+            rows.extend(self.request(query, parameters))
+        return rows
+
+    def stream(self, name, parameters=()):
+        # Run the statement called name and return the rows one at a time, so a large result does not have to fit
+        # in memory twice. Only the read-only sqlite connection can do this, otherwise all of the rows are read at once.
+        query = statements.get(name, self.db_backend)
+        rows = None
+        if self.db_backend == 'sqlite':
+            connection = self._sqlite_connection()
+            if connection is not None:
+                if self.profiler is None:
+                    rows = connection.execute(query, parameters)
+                else:
+                    rows = self._profiled_stream(query, parameters, connection)
+        if rows is None:
+            rows = iter(self.request(query, parameters))
+        if self.interrupted is None:
+            return rows
+        return self._interruptible_stream(rows)
+
+    def _interruptible_stream(self, rows):
+        for (number, row) in enumerate(rows):
+            if number % INTERRUPT_ROWS == 0:
+                self._check_interrupted()
+            yield row
+
+    def _check_interrupted(self):
+        if self.interrupted is not None and self.interrupted():
+            raise Interrupted()
+
+    def request(self, query, parameters=()):
+        # Run the text of a query and return all of the rows
+        if self.profiler is None:
+            return self._request(query, parameters)
+        started = time.perf_counter()
+        rows = self._request(query, parameters)
+        self._profile(query, parameters, time.perf_counter() - started, len(rows), sqlprofiler.result_bytes(rows))
+        return rows
+
+    def _request(self, query, parameters):
+        if self.db_backend == 'sqlite':
+            connection = self._sqlite_connection()
+            if connection is not None:
+                return connection.execute(query, parameters).fetchall()
+            return self.mypicsdb().cur.request_with_binds(query, parameters)
+        try:
+            return self.mypicsdb().cur.request_with_binds(query, parameters)
+        except Exception as error:
+            # The connection may have been closed by the server, try once more with a new one
+            xbmc.log("Reconnecting to the My Pictures Database after: %s" %(error), xbmc.LOGWARNING)
+            self._close_mypicsdb()
+            return self.mypicsdb().cur.request_with_binds(query, parameters)
+
+    def _profiled_stream(self, query, parameters, connection):
+        # Only the time spent reading the rows is measured, not the time the caller spends on each row
+        started = time.perf_counter()
+        cursor = connection.execute(query, parameters)
+        seconds = time.perf_counter() - started
+        (row_count, byte_count) = (0, 0)
+        while True:
+            started = time.perf_counter()
+            row = cursor.fetchone()
+            seconds += time.perf_counter() - started
+            if row is None:
+                break
+            row_count += 1
+            byte_count += sqlprofiler.result_bytes([row])
+            yield row
+        self._profile(query, parameters, seconds, row_count, byte_count)
+
+    def _profile(self, query, parameters, seconds, row_count, byte_count):
+        self.profiler.record(query, parameters, seconds, row_count, byte_count)
+
+    def _capture_plans(self):
+        # Get the query plans of the slowest statements, with the parameters of their slowest run
+        for (query, parameters) in self.profiler.wanted_plans():
+            try:
+                plan_rows = self._request(self.profiler.explain_statement(query), parameters)
+            except Exception as error:
+                xbmc.log("Could not get the query plan: %s" %(error), xbmc.LOGWARNING)
+                continue
+            self.profiler.add_plan(query, plan_rows)
+
+    def mypicsdb(self):
+        # The MyPicsDB object of this thread, needed to apply filters and to change the database
+        if getattr(self.local, 'mpdb', None) is None:
+            mpdb = MypicsDB.MyPictureDB()
+            with self.lock:
+                self.connections.append(mpdb.cur)
+            self.local.mpdb = mpdb
+        return self.local.mpdb
+
+    def close_thread(self):
+        # Close the connections of the calling thread, when it will not query anymore.
+        # The sqlite connection of MyPicsDB can only be closed by the thread that opened it.
+        self._close_mypicsdb()
+        connection = getattr(self.local, 'sqlite', None)
+        self.local.sqlite = None
+        if connection is None:
+            return
+        with self.lock:
+            if connection in self.connections:
+                self.connections.remove(connection)
+        connection.close()
+
+    def close(self):
+        # Close the connections of all threads, once none of them will query anymore.
+        # Threads other than the calling one must have closed their own connections with close_thread.
+        if self.profiler is not None:
+            self._capture_plans()
+            self.profiler.log_summary()
+        with self.lock:
+            connections = self.connections
+            self.connections = []
+        for connection in connections:
+            try:
+                connection.close()
+            except Exception as error:
+                xbmc.log("Could not close a connection to the My Pictures Database: %s" %(error), xbmc.LOGWARNING)
+        self.local = threading.local()
+
+    def _close_mypicsdb(self):
+        mpdb = getattr(self.local, 'mpdb', None)
+        self.local.mpdb = None
+        if mpdb is None:
+            return
+        with self.lock:
+            if mpdb.cur in self.connections:
+                self.connections.remove(mpdb.cur)
+        try:
+            mpdb.cur.close()
+        except Exception:
+            # Already broken
+            pass
+
+    def _sqlite_connection(self):
+        # The read-only connection of this thread, or None if the database file can not be opened read-only
+        connection = getattr(self.local, 'sqlite', None)
+        if connection is not None:
+            return connection
+        if self.sqlite_path is None:
+            self.sqlite_path = self._get_sqlite_path()
+        if self.sqlite_path == '':
+            return None
+        try:
+            connection = sqlite3.connect('file:%s?mode=ro' %(urllib.request.pathname2url(self.sqlite_path)),
+                                         uri=True, check_same_thread=False)
+            for pragma in SQLITE_PRAGMAS:
+                connection.execute(pragma)
+        except sqlite3.Error as error:
+            xbmc.log("Could not open %s read-only: %s" %(self.sqlite_path, error), xbmc.LOGWARNING)
+            self.sqlite_path = ''
+            return None
+        with self.lock:
+            self.connections.append(connection)
+        self.local.sqlite = connection
+        return connection
+
+    def _get_sqlite_path(self):
+        # Ask the connection of MyPicsDB which file it has opened
+        try:
+            for (number, name, path) in self.mypicsdb().cur.request("PRAGMA database_list"):
+                if name == 'main' and path:
+                    return path
+        except Exception as error:
+            xbmc.log("Could not find the My Pictures Database file: %s" %(error), xbmc.LOGWARNING)
+        return ''
@@ -0,0 +1,64 @@
+# *  This Program is free software; you can redistribute it and/or modify
+# *  it under the terms of the GNU General Public License as published by
+# *  the Free Software Foundation; either version 2, or (at your option)
+# *  any later version.
+# *
+# *  This Program is distributed in the hope that it will be useful,
+# *  but WITHOUT ANY WARRANTY; without even the implied warranty of
+# *  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# *  GNU General Public License for more details.
+# *
+# *  You should have received a copy of the GNU General Public License
+# *  along with Kodi; see the file COPYING.  If not, write to
+# *  the Free Software Foundation, 675 Mass Ave, Cambridge, MA 02139, USA.
+# *  http://www.gnu.org/copyleft/gpl.html
+
+# Cache of the pictures that match each My Pictures Database filter, stored in the addon profile folder.
+# Applying a filter can take a long time on a large database, but the filter definitions and the
+# pictures rarely change. The cached (idFile, ImageDateTime) list of a filter is only used while
+# the definition of the filter and the fingerprint of the database are the same as when it was saved.
+
+import hashlib
+import json
+import os
+
+from lib import atomicfile
+
+class FilterCache(object):
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+
+    def load(self, filter_name, definition, fingerprint):
+        # Return the cached results of a filter, or None if they are missing or out of date
+        try:
+            with open(self._path(filter_name), 'r') as cache_file:
+                cached = json.load(cache_file)
+        except (OSError, ValueError):
+            return None
+        if cached.get('definition') != definition or cached.get('fingerprint') != list(fingerprint):
+            return None
+        return [tuple(result) for result in cached['results']]
+
+    def save(self, filter_name, definition, fingerprint, results):
+        cached = {'filter': filter_name,
+                  'definition': definition,
+                  'fingerprint': list(fingerprint),
+                  'results': [list(result) for result in results]}
+        with atomicfile.replace(self._path(filter_name)) as cache_file:
+            json.dump(cached, cache_file)
+
+    def _path(self, filter_name):
+        return os.path.join(self.cache_dir, hashlib.sha1(filter_name.encode('utf-8')).hexdigest() + '.json')
+
+def filter_definition(exec_query, filter_name):
+    # Hash of the FilterWizard and FilterWizardItems rows of a filter, which changes whenever the filter is edited.
+    # Returns None if the filter does not exist or its definition can not be read.
+    try:
+        filter_ids = exec_query("filter_id", (filter_name,))
+        if len(filter_ids) != 1:
+            return None
+        rows = exec_query("filter", (filter_ids[0][0],))
+        rows += exec_query("filter_items", (filter_ids[0][0],))
+    except Exception:
+        return None
+    return hashlib.sha1(repr([tuple(row) for row in rows]).encode('utf-8')).hexdigest()
@@ -14,20 +14,30 @@
 # *  http://www.gnu.org/copyleft/gpl.html
 
 # This script queries the plugin.image.mypicsdb2 database to get a list of saved filter names.
-# It then stores the filter names as selectable options in this addon's settings.xml file.
+# It then stores the filter names as selectable options in this addon's settings.xml file,
+# and saves the pictures that match each filter so the screensaver does not have to apply them.
 
 import os.path
+import sys
 
 import xbmc
 import xbmcaddon
 
 import xml.etree.ElementTree as ET
-import mypicsdb.MypicsDB  as MypicsDB
+
+# Make the other modules of this addon importable when run with RunScript
+sys.path.insert(0, xbmcaddon.Addon().getAddonInfo('path'))
+from lib import database
+from lib import screensaver
+from lib import sqlprofiler
+
+db_backend = xbmcaddon.Addon('plugin.image.mypicsdb2').getSetting('db_backend').lower()
+pictures_database = database.Database(db_backend)
+if xbmcaddon.Addon().getSettingBool('sqlprofile'):
+    pictures_database.profiler = sqlprofiler.SqlProfiler(db_backend, xbmcaddon.Addon().getSettingInt('sqlslow'))
 
 # Get a list of all of the filter names
-MPDB = MypicsDB.MyPictureDB()
-query = """Select strFilterName FROM FilterWizard"""
-filter_names_list = MPDB.cur.request(query)
+filter_names_list = pictures_database.execute("filter_names")
 filter_names = [name[0] for name in filter_names_list]
 
 # Find where to insert the filter names in the settings.xml file
@@ -51,6 +61,11 @@ if len(filter_names) > 0:
     
 tree.write(settings_file)
 
+# Save the pictures that match each filter
+if xbmcaddon.Addon().getSettingBool('filtercache'):
+    screensaver.warm_filter_cache(pictures_database, db_backend, filter_names)
+pictures_database.close()
+
 # Notify that you must exit from settings and return to see any new filter names
 heading = xbmcaddon.Addon().getLocalizedString(30030) 
 message = xbmcaddon.Addon().getLocalizedString(30031) 
@@ -0,0 +1,137 @@
+# *  This Program is free software; you can redistribute it and/or modify
+# *  it under the terms of the GNU General Public License as published by
+# *  the Free Software Foundation; either version 2, or (at your option)
+# *  any later version.
+# *
+# *  This Program is distributed in the hope that it will be useful,
+# *  but WITHOUT ANY WARRANTY; without even the implied warranty of
+# *  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# *  GNU General Public License for more details.
+# *
+# *  You should have received a copy of the GNU General Public License
+# *  along with Kodi; see the file COPYING.  If not, write to
+# *  the Free Software Foundation, 675 Mass Ave, Cambridge, MA 02139, USA.
+# *  http://www.gnu.org/copyleft/gpl.html
+
+# Index of the perceptual hashes of the pictures, stored in a sqlite file in the addon profile folder.
+# Building it decodes every picture once, which can take hours for a large collection, so it is built
+# by a separate job that can be stopped and continued: each hash is saved with the mtime the My Pictures
+# Database has for its picture, and only new or changed pictures are hashed again.
+# In Kodi the job is started by makehashes.py. Outside of Kodi this module can be run with Python, then the
+# pictures are decoded by a pool of processes:
+#
+#   python lib/hashindex.py --database MyPictures.db --index hashes.db --processes 4
+
+import os
+import sqlite3
+import threading
+
+# Pictures hashed between two saves of the index
+BATCH_SIZE = 200
+# idFile numbers looked up with one query
+LOOKUP_CHUNK_SIZE = 500
+
+SCHEMA = "CREATE TABLE IF NOT EXISTS Hashes (idFile INTEGER PRIMARY KEY, mtime TEXT, hash INTEGER)"
+
+def to_signed(value):
+    # sqlite integers are signed 64 bit
+    if value is None:
+        return None
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+def to_unsigned(value):
+    return value + (1 << 64) if value < 0 else value
+
+class HashIndex(object):
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        # Opened on first use, by the thread that prepares the groups
+        self.connection = None
+
+    def _connect(self):
+        if self.connection is None:
+            directory = os.path.dirname(self.path)
+            if directory and not os.path.isdir(directory):
+                os.makedirs(directory)
+            self.connection = sqlite3.connect(self.path, check_same_thread=False)
+            self.connection.execute(SCHEMA)
+        return self.connection
+
+    def lookup(self, image_ids):
+        # idFile -> hash of the pictures that have been hashed
+        hashes = {}
+        with self.lock:
+            connection = self._connect()
+            for start in range(0, len(image_ids), LOOKUP_CHUNK_SIZE):
+                chunk = image_ids[start:start + LOOKUP_CHUNK_SIZE]
+                query = "SELECT idFile, hash FROM Hashes WHERE idFile IN (%s)" %(','.join('?' * len(chunk)))
+                for (image_id, value) in connection.execute(query, chunk):
+                    if value is not None:
+                        hashes[image_id] = to_unsigned(value)
+        return hashes
+
+    def outdated(self, pictures):
+        # The pictures that have not been hashed, or have changed since. pictures are (idFile, mtime, path).
+        with self.lock:
+            saved = dict(self._connect().execute("SELECT idFile, mtime FROM Hashes"))
+        return [picture for picture in pictures if saved.get(picture[0], None) != picture[1]]
+
+    def save(self, rows):
+        # Save (idFile, mtime, hash) rows, a hash of None marks a picture that could not be read
+        with self.lock:
+            connection = self._connect()
+            connection.executemany("INSERT OR REPLACE INTO Hashes (idFile, mtime, hash) VALUES (?, ?, ?)",
+                                   [(image_id, mtime, to_signed(value)) for (image_id, mtime, value) in rows])
+            connection.commit()
+
+    def close(self):
+        with self.lock:
+            if self.connection is not None:
+                self.connection.close()
+                self.connection = None
+
+def build(index, pictures, hash_picture, executor, stopped=lambda: False):
+    # Hash the pictures that are not in the index yet or have changed since, pictures are (idFile, mtime, path).
+    # hash_picture(path) returns the hash of a picture or None, and is run by the threads or processes of executor.
+    # Returns the number of pictures that were hashed.
+    outdated = index.outdated(pictures)
+    hashed = 0
+    for start in range(0, len(outdated), BATCH_SIZE):
+        if stopped():
+            break
+        batch = outdated[start:start + BATCH_SIZE]
+        # Pictures that could not be read are saved too, so they are not read again until they change
+        rows = [(image_id, mtime, value)
+                for ((image_id, mtime, path), value) in zip(batch, executor.map(hash_picture, [picture[2] for picture in batch], chunksize=8))]
+        index.save(rows)
+        hashed += len([row for row in rows if row[2] is not None])
+    return hashed
+
+def main():
+    # Build the index outside of Kodi from a sqlite My Pictures Database, for pictures on local paths
+    import argparse
+    import sys
+    from concurrent.futures import ProcessPoolExecutor
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from lib import phash
+    parser = argparse.ArgumentParser(description='Hash the pictures of a My Pictures Database')
+    parser.add_argument('--database', required=True, help='sqlite My Pictures Database')
+    parser.add_argument('--index', required=True, help='index file, hashes.db in the addon profile folder')
+    parser.add_argument('--processes', type=int, default=os.cpu_count(), help='number of worker processes')
+    arguments = parser.parse_args()
+    connection = sqlite3.connect(arguments.database)
+    pictures = [(image_id, mtime, os.path.join(path, filename))
+                for (image_id, mtime, path, filename) in connection.execute("SELECT idFile, mtime, strPath, strFilename FROM Files")
+                if filename.lower().endswith(phash.HASHED_FORMATS)]
+    connection.close()
+    index = HashIndex(arguments.index)
+    try:
+        with ProcessPoolExecutor(max_workers=arguments.processes) as executor:
+            hashed = build(index, pictures, phash.file_hash, executor)
+    finally:
+        index.close()
+    sys.stderr.write('Hashed %d of %d pictures\n' %(hashed, len(pictures)))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,268 @@
+# *  This Program is free software; you can redistribute it and/or modify
+# *  it under the terms of the GNU General Public License as published by
+# *  the Free Software Foundation; either version 2, or (at your option)
+# *  any later version.
+# *
+# *  This Program is distributed in the hope that it will be useful,
+# *  but WITHOUT ANY WARRANTY; without even the implied warranty of
+# *  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# *  GNU General Public License for more details.
+# *
+# *  You should have received a copy of the GNU General Public License
+# *  along with Kodi; see the file COPYING.  If not, write to
+# *  the Free Software Foundation, 675 Mass Ave, Cambridge, MA 02139, USA.
+# *  http://www.gnu.org/copyleft/gpl.html
+
+# On-disk cache of pictures scaled down to the size of the screen.
+# Large camera originals take a long time to decode on low power devices, even though they
+# are only displayed at screen resolution. The scaled copies are created ahead of time by a
+# small pool of worker threads, and the slideshow displays the copy when one exists.
+# The cache is kept within a byte budget by removing the least recently used copies. The copies are kept in
+# memory in the order they were last used, the cache directory is only read once, by a pool thread.
+# The same decode also creates a small copy for the background layer, which is displayed dimmed and
+# stretched to the whole screen, so Kodi does not decode every original a second time for it.
+
+import hashlib
+import io
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import xbmc
+import xbmcvfs
+
+from lib import atomicfile
+
+# Pillow is provided by the optional script.module.pil addon
+try:
+    from PIL import Image, ImageFilter, ImageOps
+except ImportError:
+    Image = None
+
+# Animated formats would lose their animation when scaled
+SKIPPED_FORMATS = ('gif', 'mng')
+CACHE_EXTENSION = '.jpg'
+JPEG_QUALITY = 90
+# The background copy is this many times smaller than the screen in each direction
+BACKGROUND_SCALE = 4
+# Radius of the blur that hides the blocks of the small background copy when Kodi stretches it
+BACKGROUND_BLUR = 1
+BACKGROUND_QUALITY = 80
+BACKGROUND_SUFFIX = '-background'
+# Marks a picture whose original is small enough to be displayed as is
+ORIGINAL_EXTENSION = '.original'
+# EXIF tag of the orientation, and its values for a picture that is turned a quarter
+EXIF_ORIENTATION = 0x0112
+TURNED_ORIENTATIONS = (5, 6, 7, 8)
+
+def decode_time(path, size):
+    # Seconds it takes to read a picture and decode it for a screen of size, like Kodi does to display it.
+    # None if Pillow is not installed.
+    if Image is None:
+        return None
+    started = time.monotonic()
+    source = xbmcvfs.File(path)
+    try:
+        data = source.readBytes()
+    finally:
+        source.close()
+    image = Image.open(io.BytesIO(data))
+    image.draft('RGB', size)
+    image.load()
+    return time.monotonic() - started
+
+class ImageCache(object):
+    def __init__(self, cache_dir, max_bytes, width, height, workers=2):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.size = (width, height)
+        self.stopped = False
+        self.lock = threading.Lock()
+        # Original path -> (cached copy, background copy), None for each that the original is used for
+        self.entries = {}
+        # Paths that have been handed to the pool, but are not done yet
+        self.pending = set()
+        if not os.path.isdir(self.cache_dir):
+            os.makedirs(self.cache_dir)
+        # Size of each cached copy and mark, the least recently used first, and their total
+        self.files = OrderedDict()
+        self.total_bytes = 0
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+        # The copies made by earlier runs are found by the first pool thread, before it makes any copies
+        self.pool.submit(self._scan)
+
+    @staticmethod
+    def available():
+        # Scaling pictures is only possible when Pillow is installed
+        return Image is not None
+
+    def get(self, path):
+        # Return the cached copy of a picture, or None if the original has to be used
+        return self._get(path, 0)
+
+    def get_background(self, path):
+        # Return the background copy of a picture, or None if the original has to be used
+        return self._get(path, 1)
+
+    def _get(self, path, kind):
+        with self.lock:
+            cached = self.entries.get(path, (None, None))[kind]
+            if cached is None:
+                return None
+            name = os.path.basename(cached)
+            if name in self.files:
+                # Mark the copy as recently used
+                self.files.move_to_end(name)
+        try:
+            # The time of the last use is also kept on the file, for the next runs
+            os.utime(cached, None)
+        except OSError:
+            # Removed to stay within the budget, it is made again the next time the picture is prefetched
+            with self.lock:
+                self.entries.pop(path, None)
+            return None
+        return cached
+
+    def prefetch(self, paths):
+        # Create the missing copies of upcoming pictures in the background
+        with self.lock:
+            missing = [path for path in paths if path not in self.entries and path not in self.pending]
+            self.pending.update(missing)
+        for path in missing:
+            self.pool.submit(self._create, path)
+
+    def busy(self, paths):
+        # True while copies of any of paths are still being created
+        with self.lock:
+            return any(path in self.pending for path in paths)
+
+    def shutdown(self):
+        # Stop creating copies; copies that are being written are finished by the pool threads
+        self.stopped = True
+        self.pool.shutdown(wait=False)
+
+    def _create(self, path):
+        cached = (None, None)
+        try:
+            if not self.stopped:
+                cached = self._scale(path)
+        except Exception as error:
+            xbmc.log("[ImageCache] Could not scale %s: %s" %(path, error), xbmc.LOGWARNING)
+        with self.lock:
+            self.pending.discard(path)
+            self.entries[path] = cached
+
+    def _scale(self, path):
+        # Returns (cached copy, background copy), None for each that the original is used for
+        if path.lower().endswith(SKIPPED_FORMATS):
+            return (None, None)
+        # The copies are identified by the path, modification time and size of the original
+        stat = xbmcvfs.Stat(path)
+        key = '%s|%d|%d' %(path, stat.st_mtime(), stat.st_size())
+        digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        cached = os.path.join(self.cache_dir, digest + CACHE_EXTENSION)
+        background = os.path.join(self.cache_dir, digest + BACKGROUND_SUFFIX + CACHE_EXTENSION)
+        original = os.path.join(self.cache_dir, digest + ORIGINAL_EXTENSION)
+        if os.path.exists(original):
+            # The original is small enough to be displayed as is
+            cached = None
+            if os.path.exists(background):
+                return (None, background)
+        elif os.path.exists(cached) and os.path.exists(background):
+            return (cached, background)
+        if cached is not None and os.path.exists(cached):
+            # Only the background copy is missing, it is made from the cached copy
+            image = Image.open(cached)
+            image.load()
+        else:
+            # Read through xbmcvfs, so pictures on network shares can be scaled too
+            source = xbmcvfs.File(path)
+            try:
+                data = source.readBytes()
+            finally:
+                source.close()
+            image = Image.open(io.BytesIO(data))
+            screen = self.size
+            if image.getexif().get(EXIF_ORIENTATION) in TURNED_ORIENTATIONS:
+                # The original is turned a quarter before it is displayed, so it is scaled to the turned screen
+                screen = (self.size[1], self.size[0])
+            if image.size[0] <= screen[0] and image.size[1] <= screen[1]:
+                # Already small enough to be displayed as is, only the background copy is made.
+                # Remember that, so the original is not read again to find out.
+                cached = None
+                image.draft('RGB', self._background_size(screen))
+                self._mark(original)
+            else:
+                # A JPEG is decoded at a fraction of its size that is still larger than the screen
+                image.draft('RGB', screen)
+                image.thumbnail(screen, Image.LANCZOS)
+            # The copies do not keep the EXIF data, so apply the orientation now, to the smaller picture
+            image = ImageOps.exif_transpose(image)
+            if image.mode != 'RGB':
+                image = image.convert('RGB')
+            if cached is not None:
+                self._save(image, cached, JPEG_QUALITY)
+        if not os.path.exists(background):
+            # Crop to the shape of the screen like the background control does, and shrink
+            small = ImageOps.fit(image, self._background_size(self.size), Image.BILINEAR).filter(ImageFilter.GaussianBlur(BACKGROUND_BLUR))
+            self._save(small, background, BACKGROUND_QUALITY)
+        return (cached, background)
+
+    @staticmethod
+    def _background_size(screen):
+        return (max(screen[0] // BACKGROUND_SCALE, 1), max(screen[1] // BACKGROUND_SCALE, 1))
+
+    def _mark(self, original):
+        # An empty file that records that the original is displayed as is
+        open(original, 'w').close()
+        self._add(os.path.basename(original), 0)
+
+    def _save(self, image, cached, quality):
+        # A partly written copy is never displayed
+        with atomicfile.replace(cached, 'wb') as cached_file:
+            image.save(cached_file, 'JPEG', quality=quality)
+        self._add(os.path.basename(cached), os.path.getsize(cached))
+
+    def _add(self, name, size):
+        # Count a new file as the most recently used one
+        with self.lock:
+            self.total_bytes += size - self.files.pop(name, 0)
+            self.files[name] = size
+        self._evict()
+
+    def _evict(self):
+        # Remove the least recently used files until the cache is within its budget, keeping at least the most
+        # recently used one. The files are removed without holding the lock.
+        removed = []
+        with self.lock:
+            while self.total_bytes > self.max_bytes and len(self.files) > 1:
+                (oldest, oldest_size) = self.files.popitem(last=False)
+                self.total_bytes -= oldest_size
+                removed.append(oldest)
+        for name in removed:
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+            except OSError:
+                pass
+
+    def _scan(self):
+        # Add the files of the cache directory made by earlier runs, the least recently used first.
+        # Files added by this run meanwhile stay the most recently used ones.
+        found = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith((CACHE_EXTENSION, ORIGINAL_EXTENSION)):
+                try:
+                    stat = os.stat(os.path.join(self.cache_dir, name))
+                except OSError:
+                    continue
+                found.append((stat.st_mtime, name, stat.st_size))
+        found.sort()
+        with self.lock:
+            files = OrderedDict((name, size) for (mtime, name, size) in found if name not in self.files)
+            files.update(self.files)
+            self.files = files
+            self.total_bytes = sum(files.values())
+        # Make room if the budget was lowered since the last run
+        self._evict()
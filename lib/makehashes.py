@@ -0,0 +1,72 @@
+# *  This Program is free software; you can redistribute it and/or modify
+# *  it under the terms of the GNU General Public License as published by
+# *  the Free Software Foundation; either version 2, or (at your option)
+# *  any later version.
+# *
+# *  This Program is distributed in the hope that it will be useful,
+# *  but WITHOUT ANY WARRANTY; without even the implied warranty of
+# *  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# *  GNU General Public License for more details.
+# *
+# *  You should have received a copy of the GNU General Public License
+# *  along with Kodi; see the file COPYING.  If not, write to
+# *  the Free Software Foundation, 675 Mass Ave, Cambridge, MA 02139, USA.
+# *  http://www.gnu.org/copyleft/gpl.html
+
+# This script hashes the pictures of the plugin.image.mypicsdb2 database that are new or have changed,
+# so the screensaver can leave out pictures that look almost the same as the one before them.
+# Kodi can not start worker processes for an addon, so the pictures are decoded by a pool of threads,
+# Pillow decodes without holding the interpreter lock. Run lib/hashindex.py outside of Kodi to use processes.
+
+import os.path
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import xbmc
+import xbmcaddon
+import xbmcvfs
+
+# Make the other modules of this addon importable when run with RunScript
+sys.path.insert(0, xbmcaddon.Addon().getAddonInfo('path'))
+from lib import database
+from lib import hashindex
+from lib import phash
+from lib import screensaver
+
+# Threads that read and hash pictures
+HASH_WORKERS = 4
+
+def hash_picture(path):
+    # Read through xbmcvfs, so pictures on network shares can be hashed too
+    try:
+        source = xbmcvfs.File(path)
+        try:
+            data = source.readBytes()
+        finally:
+            source.close()
+        return phash.image_hash(bytes(data))
+    except Exception as error:
+        xbmc.log("Could not hash %s: %s" %(path, error), xbmc.LOGWARNING)
+        return None
+
+if not phash.available():
+    screensaver.log("Hashing pictures needs the script.module.pil addon", xbmc.LOGWARNING)
+else:
+    db_backend = xbmcaddon.Addon('plugin.image.mypicsdb2').getSetting('db_backend').lower()
+    pictures_database = database.Database(db_backend)
+    pictures = [(image_id, mtime, os.path.join(path, filename))
+                for (image_id, mtime, path, filename) in pictures_database.execute("hash_pictures")
+                if filename.lower().endswith(phash.HASHED_FORMATS)]
+    pictures_database.close()
+    index = hashindex.HashIndex(screensaver.hash_index_path())
+    monitor = xbmc.Monitor()
+    try:
+        with ThreadPoolExecutor(max_workers=HASH_WORKERS) as executor:
+            hashed = hashindex.build(index, pictures, hash_picture, executor, monitor.abortRequested)
+    finally:
+        index.close()
+    screensaver.log("Hashed %d of %d pictures" %(hashed, len(pictures)))
+    # Notify that the hashes are up to date
+    heading = xbmcaddon.Addon().getLocalizedString(30057)
+    message = xbmcaddon.Addon().getLocalizedString(30058) %(hashed)
+    xbmc.executebuiltin('Notification('+heading+','+message+',10000)')
@@ -0,0 +1,33 @@
+# *  This Program is free software; you can redistribute it and/or modify
+# *  it under the terms of the GNU General Public License as published by
+# *  the Free Software Foundation; either version 2, or (at your option)
+# *  any later version.
+# *
+# *  This Program is distributed in the hope that it will be useful,
+# *  but WITHOUT ANY WARRANTY; without even the implied warranty of
+# *  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# *  GNU General Public License for more details.
+# *
+# *  You should have received a copy of the GNU General Public License
+# *  along with Kodi; see the file COPYING.  If not, write to
+# *  the Free Software Foundation, 675 Mass Ave, Cambridge, MA 02139, USA.
+# *  http://www.gnu.org/copyleft/gpl.html
+
+# This script prepares a new playlist with the current settings of this addon, so the screensaver
+# can play it without querying the plugin.image.mypicsdb2 database.
+
+import sys
+
+import xbmc
+import xbmcaddon
+
+# Make the other modules of this addon importable when run with RunScript
+sys.path.insert(0, xbmcaddon.Addon().getAddonInfo('path'))
+from lib import screensaver
+
+db_backend = xbmcaddon.Addon('plugin.image.mypicsdb2').getSetting('db_backend').lower()
+if screensaver.PlaylistWriter(db_backend).run():
+    # Notify that the playlist is ready
+    heading = xbmcaddon.Addon().getLocalizedString(30051)
+    message = xbmcaddon.Addon().getLocalizedString(30052)
+    xbmc.executebuiltin('Notification('+heading+','+message+',10000)')
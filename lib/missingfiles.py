@@ -0,0 +1,138 @@
+# *  This Program is free software; you can redistribute it and/or modify
+# *  it under the terms of the GNU General Public License as published by
+# *  the Free Software Foundation; either version 2, or (at your option)
+# *  any later version.
+# *
+# *  This Program is distributed in the hope that it will be useful,
+# *  but WITHOUT ANY WARRANTY; without even the implied warranty of
+# *  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# *  GNU General Public License for more details.
+# *
+# *  You should have received a copy of the GNU General Public License
+# *  along with Kodi; see the file COPYING.  If not, write to
+# *  the Free Software Foundation, 675 Mass Ave, Cambridge, MA 02139, USA.
+# *  http://www.gnu.org/copyleft/gpl.html
+
+# Pictures that are listed in the My Pictures Database but no longer exist, e.g. because they were moved
+# or deleted since the database was updated. Displaying a missing picture wastes a whole slide, and on a
+# network share the lookup itself can take a long time.
+# The pictures of each group are checked by a small pool of threads before the group is displayed, and the
+# missing ones are left out. Missing pictures are remembered in the addon profile folder for a while, so
+# they are left out right away the next time without asking the share again.
+# A share that is asleep or offline makes every picture look missing. So a missing picture is only remembered
+# when its folder can be read, and nothing is remembered from a group in which most of the pictures are missing.
+
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import xbmc
+import xbmcvfs
+
+from lib import atomicfile
+
+# Seconds a missing picture is remembered, after that it is checked again
+MISSING_TTL = 24 * 3600
+# Threads that check whether pictures exist
+CHECK_WORKERS = 4
+# Seconds to wait for the checks of a group. Pictures whose check takes longer are kept.
+CHECK_TIMEOUT = 2.0
+
+class MissingFiles(object):
+    def __init__(self, path, ttl=MISSING_TTL, workers=CHECK_WORKERS):
+        self.path = path
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        # Path of each missing picture -> time after which it is checked again
+        self.missing = {}
+        self.changed = False
+        # Pictures that were found by this run, they are not checked again
+        self.present = set()
+        # Folders that could be read by this run
+        self.folders = set()
+        # Totals of this run: pictures checked, left out and not checked in time
+        self.checked = 0
+        self.dropped = 0
+        self.slow = 0
+        try:
+            with open(self.path, 'r') as missing_file:
+                now = time.time()
+                self.missing = dict((path, expires) for (path, expires) in json.load(missing_file).items() if expires > now)
+        except (OSError, ValueError, AttributeError):
+            # Nothing is known to be missing yet
+            pass
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+
+    def find_missing(self, paths, timeout=CHECK_TIMEOUT):
+        # Return the set of paths that do not exist. Pictures known to be missing are not checked again,
+        # the others are checked at the same time, waiting no longer than timeout for all of them.
+        now = time.time()
+        deadline = time.monotonic() + timeout
+        with self.lock:
+            missing = set(path for path in paths if self.missing.get(path, 0) > now)
+            unknown = [path for path in set(paths) if path not in missing and path not in self.present]
+        checks = dict((self.pool.submit(xbmcvfs.exists, path), path) for path in unknown)
+        (done, not_done) = wait(checks, timeout)
+        absent = []
+        with self.lock:
+            for check in done:
+                path = checks[check]
+                try:
+                    exists = check.result()
+                except Exception as error:
+                    xbmc.log("[MissingFiles] Could not check %s: %s" %(path, error), xbmc.LOGWARNING)
+                    exists = True
+                if exists:
+                    self.present.add(path)
+                else:
+                    absent.append(path)
+            self.checked += len(done)
+            self.slow += len(not_done)
+        missing.update(absent)
+        remembered = self._remembered(absent, len(done), deadline)
+        with self.lock:
+            for path in remembered:
+                self.missing[path] = now + self.ttl
+            if remembered:
+                self.changed = True
+            self.dropped += len(missing)
+        return missing
+
+    def _remembered(self, absent, checked, deadline):
+        # The pictures of absent that are remembered as missing for the next runs: none if most of the checked
+        # pictures are missing, otherwise the ones whose folder can be read before the deadline
+        if len(absent) == 0 or len(absent) * 2 > checked:
+            return []
+        folders = dict((path, path[:len(path) - len(os.path.basename(path))]) for path in absent)
+        with self.lock:
+            unknown = set(folders.values()) - self.folders
+        checks = dict((self.pool.submit(xbmcvfs.exists, folder), folder) for folder in unknown)
+        (done, not_done) = wait(checks, max(deadline - time.monotonic(), 0))
+        with self.lock:
+            for check in done:
+                try:
+                    if check.result():
+                        self.folders.add(checks[check])
+                except Exception as error:
+                    xbmc.log("[MissingFiles] Could not check %s: %s" %(checks[check], error), xbmc.LOGWARNING)
+            return [path for (path, folder) in folders.items() if folder in self.folders]
+
+    def save(self):
+        # Remember the missing pictures for the next run
+        with self.lock:
+            if not self.changed:
+                return
+            missing = dict(self.missing)
+            self.changed = False
+        with atomicfile.replace(self.path) as missing_file:
+            json.dump(missing, missing_file)
+
+    def shutdown(self):
+        # Checks that are still running are finished by the pool threads, their results are not saved
+        self.pool.shutdown(wait=False)
+        try:
+            self.save()
+        except OSError as error:
+            xbmc.log("[MissingFiles] Could not save %s: %s" %(self.path, error), xbmc.LOGWARNING)
@@ -0,0 +1,87 @@
+# *  This Program is free software; you can redistribute it and/or modify
+# *  it under the terms of the GNU General Public License as published by
+# *  the Free Software Foundation; either version 2, or (at your option)
+# *  any later version.
+# *
+# *  This Program is distributed in the hope that it will be useful,
+# *  but WITHOUT ANY WARRANTY; without even the implied warranty of
+# *  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# *  GNU General Public License for more details.
+# *
+# *  You should have received a copy of the GNU General Public License
+# *  along with Kodi; see the file COPYING.  If not, write to
+# *  the Free Software Foundation, 675 Mass Ave, Cambridge, MA 02139, USA.
+# *  http://www.gnu.org/copyleft/gpl.html
+
+# Perceptual hashes of pictures, to find pictures that look almost the same, e.g. the same scene taken
+# again a few seconds or minutes later. The hash is a 64 bit difference hash: the picture is shrunk to
+# 9x8 grey pixels, and each bit tells whether a pixel is brighter than the one to its right.
+# Pictures that look alike have hashes that differ in only a few bits.
+# This module does not use Kodi, so it can also be used by worker processes outside of Kodi.
+
+import io
+
+# Pillow is provided by the optional script.module.pil addon
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+# NumPy is provided by the optional script.module.numpy addon, the bit math is done in Python without it
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+HASH_WIDTH = 8
+HASH_HEIGHT = 8
+# Formats that are hashed, animated formats are left out
+HASHED_FORMATS = ('bmp', 'jpeg', 'jpg', 'png', 'tiff', 'pcx', 'tga')
+
+def available():
+    # Hashing pictures is only possible when Pillow is installed
+    return Image is not None
+
+def image_hash(data):
+    # The hash of a picture from the bytes of its file
+    image = Image.open(io.BytesIO(data))
+    # Let the JPEG decoder shrink the picture while decoding, which is much faster than decoding all of it
+    image.draft('L', (HASH_WIDTH * 8, HASH_HEIGHT * 8))
+    image = image.convert('L').resize((HASH_WIDTH + 1, HASH_HEIGHT), Image.BILINEAR)
+    if numpy is not None:
+        pixels = numpy.asarray(image, dtype=numpy.int16)
+        bits = (pixels[:, 1:] > pixels[:, :-1]).flatten()
+        return int.from_bytes(numpy.packbits(bits).tobytes(), 'big')
+    pixels = list(image.getdata())
+    value = 0
+    for row in range(HASH_HEIGHT):
+        for column in range(HASH_WIDTH):
+            left = pixels[row * (HASH_WIDTH + 1) + column]
+            value = (value << 1) | (1 if pixels[row * (HASH_WIDTH + 1) + column + 1] > left else 0)
+    return value
+
+def file_hash(path):
+    # The hash of a local picture file, or None if it can not be read. Used by worker processes.
+    try:
+        with open(path, 'rb') as picture_file:
+            return image_hash(picture_file.read())
+    except (OSError, ValueError):
+        return None
+
+def neighbour_distances(hashes):
+    # The number of bits each hash differs from the hash before it, None for the first one and
+    # for hashes that are None or follow a None
+    distances = [None] * len(hashes)
+    pairs = [index for index in range(1, len(hashes)) if hashes[index] is not None and hashes[index - 1] is not None]
+    if len(pairs) == 0:
+        return distances
+    if numpy is not None:
+        current = numpy.array([hashes[index] for index in pairs], dtype=numpy.uint64)
+        previous = numpy.array([hashes[index - 1] for index in pairs], dtype=numpy.uint64)
+        bit_counts = numpy.unpackbits((current ^ previous).view(numpy.uint8)).reshape(-1, 64).sum(axis=1)
+        for (index, bit_count) in zip(pairs, bit_counts.tolist()):
+            distances[index] = bit_count
+    else:
+        for index in pairs:
+            distances[index] = bin(hashes[index] ^ hashes[index - 1]).count('1')
+    return distances
@@ -0,0 +1,104 @@
+# *  This Program is free software; you can redistribute it and/or modify
+# *  it under the terms of the GNU General Public License as published by
+# *  the Free Software Foundation; either version 2, or (at your option)
+# *  any later version.
+# *
+# *  This Program is distributed in the hope that it will be useful,
+# *  but WITHOUT ANY WARRANTY; without even the implied warranty of
+# *  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# *  GNU General Public License for more details.
+# *
+# *  You should have received a copy of the GNU General Public License
+# *  along with Kodi; see the file COPYING.  If not, write to
+# *  the Free Software Foundation, 675 Mass Ave, Cambridge, MA 02139, USA.
+# *  http://www.gnu.org/copyleft/gpl.html
+
+# Playlist of groups of pictures prepared in advance, stored in the addon profile folder.
+# Each group holds everything that is displayed with it (burst flag, pictures and information fields),
+# so the screensaver can play the groups in order without any queries.
+# The playlist can only be used with the settings it was prepared with. The fingerprint of the database
+# it was prepared from is saved with it, so a new one can be prepared when pictures are added or removed.
+# How far the playlist has been played is saved in a small file next to it when a group is shown, so the
+# next run of the screensaver goes on where the last one stopped.
+
+import json
+import os
+import uuid
+
+from lib import atomicfile
+
+class Playlist(object):
+    def __init__(self, path):
+        self.path = path
+        self.position_path = path + '.position'
+        self.groups = []
+        self.position = 0
+        self.fingerprint = None
+        # Identifies the playlist file that was opened, a new one is written with a new id
+        self.playlist_id = None
+        self.modified = None
+
+    def open(self, key):
+        # Load the playlist. Returns False if there is none, or it was prepared with other settings.
+        self.groups = []
+        self.position = 0
+        self.playlist_id = None
+        try:
+            self.modified = os.stat(self.path).st_mtime_ns
+            with open(self.path, 'r') as playlist_file:
+                playlist = json.load(playlist_file)
+        except (OSError, ValueError):
+            return False
+        # Compare the way the key was saved, e.g. tuples become lists
+        if playlist.get('key') != json.loads(json.dumps(key)):
+            return False
+        self.groups = [(fastmode, [tuple(picture) for picture in picture_group], info_fields)
+                       for (fastmode, picture_group, info_fields) in playlist['groups']]
+        self.fingerprint = playlist['fingerprint']
+        self.playlist_id = playlist['id']
+        try:
+            with open(self.position_path, 'r') as position_file:
+                (playlist_id, position) = json.load(position_file)
+            if playlist_id == self.playlist_id:
+                self.position = min(position, len(self.groups))
+        except (OSError, ValueError, TypeError):
+            # Not played yet
+            pass
+        return True
+
+    def replaced(self):
+        # True if a new playlist has been written since this one was opened
+        try:
+            return os.stat(self.path).st_mtime_ns != self.modified
+        except OSError:
+            return False
+
+    def remaining(self):
+        return len(self.groups) - self.position
+
+    def next(self):
+        # The next group of the playlist and the position to save with save_position once it is shown,
+        # or None once all of the groups have been read
+        if self.position >= len(self.groups):
+            return None
+        group = self.groups[self.position]
+        self.position += 1
+        return (group, (self.playlist_id, self.position))
+
+    def save_position(self, position):
+        # Called when a group is shown, with the position next returned with it
+        try:
+            with open(self.position_path, 'w') as position_file:
+                json.dump(list(position), position_file)
+        except OSError:
+            # The next run may show the group again
+            pass
+
+    def save(self, key, fingerprint, groups):
+        playlist = {'key': key,
+                    'fingerprint': fingerprint,
+                    'id': uuid.uuid4().hex,
+                    'groups': [[fastmode, [list(picture) for picture in picture_group], info_fields]
+                               for (fastmode, picture_group, info_fields) in groups]}
+        with atomicfile.replace(self.path) as playlist_file:
+            json.dump(playlist, playlist_file, separators=(',', ':'))
@@ -0,0 +1,83 @@
+# *  This Program is free software; you can redistribute it and/or modify
+# *  it under the terms of the GNU General Public License as published by
+# *  the Free Software Foundation; either version 2, or (at your option)
+# *  any later version.
+# *
+# *  This Program is distributed in the hope that it will be useful,
+# *  but WITHOUT ANY WARRANTY; without even the implied warranty of
+# *  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# *  GNU General Public License for more details.
+# *
+# *  You should have received a copy of the GNU General Public License
+# *  along with Kodi; see the file COPYING.  If not, write to
+# *  the Free Software Foundation, 675 Mass Ave, Cambridge, MA 02139, USA.
+# *  http://www.gnu.org/copyleft/gpl.html
+
+# Groups of pictures prepared by the service while Kodi is idle, stored in the addon profile folder.
+# The screensaver shows them first, so it does not have to wait for the database when it starts.
+# The groups are used once, and only while the settings they were prepared with and the
+# fingerprint of the database are the same as when they were saved. The key of the groups starts with the
+# fingerprint. The time it was last compared with the database is saved too, so the service does not have to
+# query the database every time it finds Kodi idle.
+
+import json
+import os
+import time
+
+from lib import atomicfile
+
+class PreparedGroups(object):
+    def __init__(self, path):
+        self.path = path
+
+    def ready(self, key):
+        # True if there are saved groups that can be used with key
+        return self._load(key) is not None
+
+    def recent(self, settings_key, seconds):
+        # True if there are saved groups for settings_key, the key without the fingerprint, whose fingerprint
+        # was compared with the database less than seconds ago
+        prepared = self._read()
+        if prepared is None or prepared.get('key', [])[1:] != json.loads(json.dumps(settings_key)):
+            return False
+        return time.time() - prepared.get('checked', 0) < seconds
+
+    def checked(self, key):
+        # Record that the saved groups still match the database
+        groups = self._load(key)
+        if groups is not None:
+            self.save(key, groups)
+
+    def take(self, key):
+        # Return the saved groups and remove them, or None if there are none that can be used with key
+        groups = self._load(key)
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+        return groups
+
+    def save(self, key, groups):
+        prepared = {'key': key,
+                    'checked': time.time(),
+                    'groups': [[fastmode, [list(picture) for picture in picture_group], info_fields]
+                               for (fastmode, picture_group, info_fields) in groups]}
+        with atomicfile.replace(self.path) as prepared_file:
+            json.dump(prepared, prepared_file)
+
+    def _read(self):
+        try:
+            with open(self.path, 'r') as prepared_file:
+                return json.load(prepared_file)
+        except (OSError, ValueError):
+            return None
+
+    def _load(self, key):
+        prepared = self._read()
+        if prepared is None:
+            return None
+        # Compare the way the key was saved, e.g. tuples become lists
+        if prepared.get('key') != json.loads(json.dumps(key)):
+            return None
+        return [(fastmode, [tuple(picture) for picture in picture_group], info_fields)
+                for (fastmode, picture_group, info_fields) in prepared['groups']]
@@ -0,0 +1,67 @@
+# *  This Program is free software; you can redistribute it and/or modify
+# *  it under the terms of the GNU General Public License as published by
+# *  the Free Software Foundation; either version 2, or (at your option)
+# *  any later version.
+# *
+# *  This Program is distributed in the hope that it will be useful,
+# *  but WITHOUT ANY WARRANTY; without even the implied warranty of
+# *  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# *  GNU General Public License for more details.
+# *
+# *  You should have received a copy of the GNU General Public License
+# *  along with Kodi; see the file COPYING.  If not, write to
+# *  the Free Software Foundation, 675 Mass Ave, Cambridge, MA 02139, USA.
+# *  http://www.gnu.org/copyleft/gpl.html
+
+# The Screensaver.* properties of the screensaver window, which the skin uses to show the labels and animations.
+# Every write of a property goes into Kodi and makes the skin check its conditions again, so the last value
+# written to each property is remembered and writes that would not change anything are skipped.
+# All of the properties that were written are cleared when the screensaver stops.
+
+import threading
+
+PREFIX = 'Screensaver.'
+
+class WindowProperties(object):
+    def __init__(self, window):
+        self.window = window
+        self.lock = threading.Lock()
+        # name -> last value written, None once cleared. Properties that were never written are not in it,
+        # they may still be set by an earlier run, so the first write of each is never skipped.
+        self.values = {}
+        self.closed = False
+        # Number of writes that were made, and that were skipped
+        self.writes = 0
+        self.skipped = 0
+
+    def set(self, name, value):
+        self.update({name: value})
+
+    def clear(self, name):
+        self.update({name: None})
+
+    def update(self, values):
+        # Write several properties at once, a value of None clears the property
+        with self.lock:
+            if self.closed:
+                # The screensaver has stopped, properties written now would stay set
+                return
+            for (name, value) in values.items():
+                if name in self.values and self.values[name] == value:
+                    self.skipped += 1
+                    continue
+                if value is None:
+                    self.window.clearProperty(PREFIX + name)
+                else:
+                    self.window.setProperty(PREFIX + name, value)
+                self.values[name] = value
+                self.writes += 1
+
+    def close(self):
+        # Clear every property that was set, and ignore any later writes
+        with self.lock:
+            self.closed = True
+            for (name, value) in self.values.items():
+                if value is not None:
+                    self.window.clearProperty(PREFIX + name)
+            self.values = {}
@@ -0,0 +1,110 @@
+# *  This Program is free software; you can redistribute it and/or modify
+# *  it under the terms of the GNU General Public License as published by
+# *  the Free Software Foundation; either version 2, or (at your option)
+# *  any later version.
+# *
+# *  This Program is distributed in the hope that it will be useful,
+# *  but WITHOUT ANY WARRANTY; without even the implied warranty of
+# *  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# *  GNU General Public License for more details.
+# *
+# *  You should have received a copy of the GNU General Public License
+# *  along with Kodi; see the file COPYING.  If not, write to
+# *  the Free Software Foundation, 675 Mass Ave, Cambridge, MA 02139, USA.
+# *  http://www.gnu.org/copyleft/gpl.html
+
+# Timing of the slides. Each slide has a deadline on the monotonic clock, and the next deadline is
+# the previous one plus the time the slide is displayed, so the time spent on queries, decoding and
+# the label fade is absorbed instead of added to every slide. Waiting is done on the stop event, so
+# the show ends as soon as the screensaver is deactivated.
+# Bursts are paced to what the device can keep up with: frames are left out evenly when it can not
+# show them as fast as configured, so a burst still takes as long as it would with every frame.
+
+import time
+
+# Seconds between checks for a Kodi shutdown while waiting, Kodi does not notify the addon of it
+POLL_INTERVAL = 0.05
+# Share of the time between two burst frames that decoding a frame may take, the rest is left for Kodi to render
+BURST_HEADROOM = 0.75
+# Weight of the newest frame in the estimate of the time it takes to decode a frame
+BURST_SMOOTHING = 0.2
+
+class SlideScheduler(object):
+    def __init__(self, stop_event, abort_requested, timer):
+        # stop_event is set when the show stops, abort_requested() is true when Kodi shuts down
+        self.stop_event = stop_event
+        self.abort_requested = abort_requested
+        self.timer = timer
+        # Deadline of the next slide, None until the first slide is shown
+        self.deadline = None
+        # Seconds the previous slide was displayed for
+        self.period = 0
+
+    def stopped(self):
+        return self.stop_event.is_set() or self.abort_requested()
+
+    def slide_shown(self):
+        # Call when a slide is shown: records how far it missed its deadline in milliseconds.
+        # A slide that is more than a whole slide late (e.g. the next group was not ready yet) starts
+        # a new schedule, otherwise the following slides would be rushed to catch up.
+        now = time.monotonic()
+        if self.deadline is None:
+            self.deadline = now
+        late = now - self.deadline
+        self.timer.add('late', late * 1000.0)
+        if late > self.period:
+            self.deadline = now
+
+    def wait_next(self, period):
+        # Wait until the current slide has been displayed for period seconds since its deadline.
+        # Returns False if the show stopped meanwhile.
+        self.period = period
+        self.deadline += period
+        return self.wait_until(self.deadline)
+
+    def pause(self, seconds):
+        # Wait a number of seconds that are not part of any slide, e.g. for the label to fade before a burst.
+        # The deadline of the next slide is moved by the same time. Returns False if the show stopped meanwhile.
+        if self.deadline is not None:
+            self.deadline += seconds
+        return self.sleep(seconds)
+
+    def sleep(self, seconds):
+        # Wait a number of seconds, e.g. for a label to fade. Returns False if the show stopped meanwhile.
+        return self.wait_until(time.monotonic() + seconds)
+
+    def wait_until(self, deadline):
+        while not self.stopped():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return True
+            self.stop_event.wait(min(remaining, POLL_INTERVAL))
+        return False
+
+class BurstPacer(object):
+    # Chooses the frames of a burst to show, and the time between them, from how long decoding a frame takes.
+    # The frames are decoded by the worker thread before the burst is queued, so the estimate is ready when the
+    # display loop plans the burst. setImage only hands the file to Kodi, so the time it takes tells nothing.
+    def __init__(self):
+        # Seconds it takes to decode a frame, None until the first frame has been decoded
+        self.frame_time = None
+
+    def plan(self, count, interval):
+        # Returns (positions of the frames to show, seconds between them) for a burst of count frames
+        # that are meant to be shown interval seconds apart
+        if self.frame_time is None or count < 3:
+            return (list(range(count)), interval)
+        sustainable = self.frame_time / BURST_HEADROOM
+        if sustainable <= interval:
+            return (list(range(count)), interval)
+        # Keep the first and the last frame and as many evenly spaced frames in between as can be shown in time
+        shown = min(max(int(count * interval / sustainable), 2), count)
+        positions = [int(round(number * (count - 1) / float(shown - 1))) for number in range(shown)]
+        return (positions, count * interval / shown)
+
+    def frame_decoded(self, seconds):
+        # Record how long decoding a frame took
+        if self.frame_time is None:
+            self.frame_time = seconds
+        else:
+            self.frame_time += BURST_SMOOTHING * (seconds - self.frame_time)
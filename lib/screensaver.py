@@ -56,18 +56,41 @@
 #     5. Multiple slide transition effects can be chosen.
 #     6. Slides can be displayed dimmed.
 
+import bisect
+import calendar
+import functools
 import os.path
 import sys
+import queue
 import random
+import threading
 import time
+import traceback
 import urllib.parse
-from datetime import datetime
+from collections import OrderedDict
+from datetime import datetime, timedelta
 
 import xbmc
 import xbmcgui
 import xbmcaddon
+import xbmcvfs
 
-import mypicsdb.MypicsDB  as MypicsDB
+from lib import candidates
+from lib import database
+from lib import filtercache
+from lib import hashindex
+from lib import imagecache
+from lib import missingfiles
+from lib import phash
+from lib import preparedgroups
+from lib import playlist
+from lib import properties
+from lib import scheduler
+from lib import selectionindex
+from lib import sqlprofiler
+from lib import statements
+from lib import timeline
+from lib import timing
 
 ADDON = xbmcaddon.Addon()
 
@@ -75,20 +98,21 @@ SETTINGS_ERROR = ADDON.getLocalizedString(30026)
 NO_FILTER_NAME_ERROR = ADDON.getLocalizedString(30027)
 BAD_FILTER_NAME_ERROR = ADDON.getLocalizedString(30028)
 NO_FILES_MATCH_FILTER = ADDON.getLocalizedString(30029)
+NO_PICTURES_FOUND = ADDON.getLocalizedString(30061)
 
 def log(msg, level=xbmc.LOGINFO):
         filename = os.path.basename(sys._getframe(1).f_code.co_filename)
         lineno  = str(sys._getframe(1).f_lineno)
         xbmc.log(str("[%s] line %5d in %s >> %s"%(ADDON.getAddonInfo('name'), int(lineno), filename, msg.__str__())), level)
 
-# DateTimes are stored and retreived differently between mysql and sqlite.
-IMGDATE =     {"mysql" :"DATE_FORMAT(ImageDateTime,'%Y-%m-%d')", 
-               "sqlite":"SUBSTR(ImageDateTime, 0, 11)"}
-IMGDATETIME = {"mysql" :"DATE_FORMAT(ImageDateTime,'%Y-%m-%d %T')", 
-               "sqlite":"ImageDateTime"}
+# Optional index in the My Pictures Database that covers the date group queries
+DATE_INDEX = "idxGroupedPicturesDateTime"
+# mysql can only index a prefix of long strings
+DATE_INDEX_CREATE = {"mysql" :"CREATE INDEX %s ON Files (ImageDateTime, strFilename(191))",
+                     "sqlite":"CREATE INDEX %s ON Files (ImageDateTime, strFilename)"}
 
 # Formats that can be displayed in a slideshow
-PICTURE_FORMATS = ('bmp', 'jpeg', 'jpg', 'gif', 'png', 'tiff', 'mng', 'ico', 'pcx', 'tga')
+PICTURE_FORMATS = statements.PICTURE_FORMATS
 
 # Random effect list for pan/zoom transitions
 EFFECTLIST = ["('conditional', 'effect=zoom start=100 end=400 center=auto time=250000 condition=true'),",
@@ -111,58 +135,167 @@ FOLDERNAME = 2
 FOLDER_AND_FILENAME = 3
 FULL_PATH = 4
 
-# Get the Database from the My Pictures Database addon
-MPDB = MypicsDB.MyPictureDB()
+# Number of pictures whose tags are kept in memory between slides
+TAG_CACHE_SIZE = 500
+# MyPicsDB tag types that can be displayed for each slide, and the window property that displays them
+TAG_TYPES = OrderedDict([('Headline', 'Headline'),
+                         ('Caption/abstract', 'Caption'),
+                         ('Sub-location', 'Sublocation'),
+                         ('City', 'City'),
+                         ('Province/state', 'State'),
+                         ('Country/primary location name', 'Country')])
+# Number of random places in the Files table that are tried to find the date of the first group
+FAST_START_ATTEMPTS = 5
+# Number of the pictures that match the filter read to choose the first group from
+FAST_START_FILTER_LIMIT = 200
 
-class Screensaver(xbmcgui.WindowXMLDialog):
-    def __init__(self, *args, **kwargs):
-        pass
+# Pictures taken no more than BURST_MAX_GAP seconds apart belong to the same burst,
+# and a burst needs at least BURST_MIN_PICTURES pictures to be displayed quickly
+BURST_MAX_GAP = 2
+BURST_MIN_PICTURES = 5
+# Number of dates whose bursts are kept in memory
+BURST_CACHE_SIZE = 200
+# Number of pictures read before and after a group to find the burst it is part of, doubled until the whole burst is read
+BURST_WINDOW = 50
+# Number of prepared groups of pictures waiting to be displayed
+GROUP_QUEUE_SIZE = 2
+# Window properties that display information about the current picture
+INFO_FIELDS = ('Headline', 'Caption', 'Sublocation', 'City', 'State', 'Country',
+               'Date', 'Time', 'FolderLocation', 'Folder', 'File', 'FileExtension')
+# Number of threads that create the scaled copies of upcoming pictures
+IMAGE_CACHE_WORKERS = 2
+# Seconds between the timing summaries written to the log
+TIMING_REPORT_INTERVAL = 60
+# Seconds the worker waits for the image cache to scale the pictures of a burst before it is queued
+BURST_PRELOAD_TIME = 10
+# Pictures of each burst that are decoded to measure how fast this device can show them
+BURST_DECODE_SAMPLES = 2
+# Seconds the label of the previous picture takes to fade out, part of the time each picture is displayed
+LABEL_FADE_TIME = 1.0
+# Number of groups the service prepares for the start of the screensaver
+PREPARED_GROUPS = 3
+# Ways the pictures are split into groups
+GROUP_BY_DATE = 0
+GROUP_BY_EVENT = 1
+SECONDS_PER_HOUR = 3600
+# Groups tried in a row when all of the pictures of a group are missing
+MISSING_GROUP_ATTEMPTS = 5
+# Seconds the worker waits after a round of groups whose pictures were all missing, doubled after each such round
+MISSING_ROUND_PAUSE = 1
+# Rounds in a row whose pictures are all missing after which the show stops, e.g. when the share is offline
+MISSING_ROUNDS = 5
+# Largest number of bits the hashes of two pictures differ in when they look almost the same
+DUPLICATE_DISTANCE = 6
+# A new playlist is prepared when fewer groups than this are left to play
+PLAYLIST_REFILL_GROUPS = 10
 
-    def onInit(self):
-        self.db_backend = xbmcaddon.Addon('plugin.image.mypicsdb2').getSetting('db_backend').lower()
-        # Load variables
-        self._get_vars()
-        # Get addon settings
-        self._get_settings()
-        # Set UI Component information
-        self._set_ui_components()
-        # Initialize global lists 
-        if self.slideshow_filter:
-            # We are going to use a MyPicsDB filter, then get all of the possible pictures we could use to start a group
-            self._get_filtered_pictures() # !SIDE EFFECT! Sets self.slideshow_filter to False on error
-        if not self.slideshow_filter:
-            # Not using a filter, so get a list of all the unique dates of the images
-            self._get_unique_dates()
-        # Start the show
-        self._start_show()
+def epoch_seconds(imgdatetime):
+    # Seconds since the epoch of a 'YYYY-MM-DD HH:MM:SS' ImageDateTime, much faster than strptime.
+    # ImageDateTime has no timezone, so it is treated as UTC and differences are not affected by DST changes.
+    return calendar.timegm((int(imgdatetime[0:4]), int(imgdatetime[5:7]), int(imgdatetime[8:10]),
+                            int(imgdatetime[11:13]), int(imgdatetime[14:16]), int(imgdatetime[17:19]), 0, 0, 0))
 
+def find_bursts(epochs, max_gap=BURST_MAX_GAP, min_pictures=BURST_MIN_PICTURES):
+    # Split a sorted list of epoch seconds into runs where neighbouring pictures are no more than max_gap apart.
+    # Returns (start, end, size) of each run with at least min_pictures pictures, end is exclusive.
+    bursts = []
+    start = 0
+    for index in range(1, len(epochs) + 1):
+        if index == len(epochs) or epochs[index] - epochs[index - 1] > max_gap:
+            if index - start >= min_pictures:
+                bursts.append((start, index, index - start))
+            start = index
+    return bursts
+
+def database_fingerprint(exec_query, db_backend):
+    # Cheap summary of the Files table that changes when pictures are added or removed
+    (row_count, max_id) = exec_query("fingerprint")[0]
+    return (db_backend, int(row_count), int(max_id or 0))
+
+def resolve_pictures(exec_many, pictures):
+    # Get the idFile number and ImageDateTime for a list of (folder, file) pairs.
+    # The pairs are looked up in batches, so there are only a few queries even for many thousands of pictures.
+    # Pairs that are not found in the Files table are dropped.
+    pictures = [(folder, file) for (folder, file) in pictures]
+    resolved = {}
+    for (image_id, imgdatetime, folder, file) in exec_many("resolve", statements.pair_batches(sorted(set(pictures)))):
+        if not imgdatetime:
+            # Without a date the picture can not start a group
+            continue
+        # Keep the first row found, the same as a lookup of the single pair would
+        resolved.setdefault((folder, file), (image_id, imgdatetime))
+    return [resolved[picture] for picture in pictures if picture in resolved]
+
+def filter_cache_dir():
+    return os.path.join(xbmcvfs.translatePath(ADDON.getAddonInfo('profile')), 'filtercache')
+
+def playlist_store():
+    return playlist.Playlist(os.path.join(xbmcvfs.translatePath(ADDON.getAddonInfo('profile')), 'playlist.json'))
+
+def missing_files_path():
+    return os.path.join(xbmcvfs.translatePath(ADDON.getAddonInfo('profile')), 'missingfiles.json')
+
+def hash_index_path():
+    return os.path.join(xbmcvfs.translatePath(ADDON.getAddonInfo('profile')), 'hashes.db')
+
+def prepared_groups_store():
+    return preparedgroups.PreparedGroups(os.path.join(xbmcvfs.translatePath(ADDON.getAddonInfo('profile')), 'preparedgroups.json'))
+
+def warm_filter_cache(pictures_database, db_backend, filter_names):
+    # Apply each filter and save the pictures that match it, unless the saved ones are still up to date
+    cache = filtercache.FilterCache(filter_cache_dir())
+    fingerprint = database_fingerprint(pictures_database.execute, db_backend)
+    for filter_name in filter_names:
+        definition = filtercache.filter_definition(pictures_database.execute, filter_name)
+        if definition is None or cache.load(filter_name, definition, fingerprint) is not None:
+            continue
+        results = pictures_database.mypicsdb().filterwizard_get_pics_from_filter(filter_name, 0)
+        matches = [result for result in results if result[1].lower().endswith(PICTURE_FORMATS)]
+        cache.save(filter_name, definition, fingerprint, resolve_pictures(pictures_database.execute_many, matches))
+
+class LRUCache(object):
+    # Small dictionary that forgets the least recently used entries once maxsize is reached
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.items = OrderedDict()
+
+    def __contains__(self, key):
+        return key in self.items
+
+    def get(self, key, default=None):
+        if key not in self.items:
+            return default
+        self.items.move_to_end(key)
+        return self.items[key]
+
+    def put(self, key, value):
+        self.items[key] = value
+        self.items.move_to_end(key)
+        while len(self.items) > self.maxsize:
+            self.items.popitem(last=False)
+
+class Slideshow(object):
+    # Chooses the groups of pictures to display and gets everything that is displayed with them.
+    # It has no window, so the service can also prepare groups before the screensaver starts.
     def _get_vars(self):
-        # Get the screensaver window id
-        self.winid = xbmcgui.Window(xbmcgui.getCurrentWindowDialogId())
-        # Init the monitor class to catch onscreensaverdeactivated calls
-        self.Monitor = MyMonitor(action = self._exit)
-        self.stop = False
-        # Set the skin name so we can have different looks for different skins
-        self.winid.setProperty('SkinName',xbmc.getSkinDir())
-        # Get MyPicsDB tagids for the information that can be displayed for each slide
-        _query = " Select idTagType FROM TagTypes WHERE TagType = 'Headline'; "
-        _ids = self._exec_query(_query)
-        self.headline_tagid = _ids[0][0]
-        _query = " Select idTagType FROM TagTypes WHERE TagType = 'Caption/abstract'; "
-        _ids = self._exec_query(_query)
-        self.caption_tagid = _ids[0][0]
-        _query = " Select idTagType FROM TagTypes WHERE TagType = 'Sub-location'; "
-        _ids = self._exec_query(_query)
-        self.sublocation_tagid = _ids[0][0]
-        _query = " Select idTagType FROM TagTypes WHERE TagType = 'City'; "
-        _ids = self._exec_query(_query)
-        self.city_tagid= _ids[0][0]
-        _query = " Select idTagType FROM TagTypes WHERE TagType = 'Province/state'; "
-        _ids = self._exec_query(_query)
-        self.state_tagid= _ids[0][0]
-        _query = " Select idTagType FROM TagTypes WHERE TagType = 'Country/primary location name'; "
-        _ids = self._exec_query(_query)
-        self.country_tagid= _ids[0][0]
+        # Connections to the My Pictures Database, opened by each thread on its first query
+        self.database = database.Database(self.db_backend)
+        # Timings of the phases of the slideshow, enabled by the timings setting
+        self.timer = timing.PhaseTimer(False)
+        # MyPicsDB tagids of the information that can be displayed for each slide, read with the first tags
+        self.tag_properties = None
+        # Tags of the pictures in the current and upcoming groups, keyed by idFile
+        self.tag_cache = LRUCache(TAG_CACHE_SIZE)
+        # Bursts found in the pictures of each date, keyed by date
+        self.burst_cache = LRUCache(BURST_CACHE_SIZE)
+        # The dates or filtered pictures are loaded by the worker thread that prepares the groups
+        self.distinct_dates = None
+        self.filtered_candidates = None
+        self.filter_cache_key = None
+        self.selection_index = None
+        # The timeline of all of the displayable pictures and the groups in a random order, when enabled
+        self.timeline = None
+        self.timeline_groups = None
 
     def _get_settings(self):
         # read addon settings
@@ -183,6 +316,648 @@ class Screensaver(xbmcgui.WindowXMLDialog):
         self.slideshow_filtername = ADDON.getSettingString('filtername')
         self.slideshow_burst = ADDON.getSettingBool('burst')
         self.slideshow_burst_time = ADDON.getSettingInt('bursttime')
+        self.slideshow_burst_gap = ADDON.getSettingInt('burstgap')
+        self.slideshow_burst_pictures = ADDON.getSettingInt('burstpictures')
+        self.slideshow_daterange = ADDON.getSettingBool('daterange')
+        self.slideshow_dateindex = ADDON.getSettingBool('dateindex')
+        self.slideshow_imagecache = ADDON.getSettingBool('imagecache')
+        self.slideshow_imagecache_size = ADDON.getSettingInt('imagecachesize')
+        self.slideshow_faststart = ADDON.getSettingBool('faststart')
+        self.slideshow_selectionindex = ADDON.getSettingBool('selectionindex')
+        self.slideshow_filtercache = ADDON.getSettingBool('filtercache')
+        self.slideshow_missingfiles = ADDON.getSettingBool('missingfiles')
+        self.slideshow_duplicates = ADDON.getSettingBool('duplicates')
+        self.slideshow_grouping = ADDON.getSettingInt('grouping')
+        self.slideshow_eventgap = ADDON.getSettingInt('eventgap')
+        # Events can only be found in the timeline
+        self.slideshow_timeline = ADDON.getSettingBool('timeline') or self.slideshow_grouping == GROUP_BY_EVENT
+        self.slideshow_playlist = ADDON.getSettingBool('playlist')
+        self.slideshow_playlist_hours = ADDON.getSettingInt('playlisthours')
+        self.timer.enabled = ADDON.getSettingBool('timings')
+        if ADDON.getSettingBool('sqlprofile'):
+            self.database.profiler = sqlprofiler.SqlProfiler(self.db_backend, ADDON.getSettingInt('sqlslow'))
+
+    def _set_image_cache(self, workers=IMAGE_CACHE_WORKERS):
+        self.image_cache = None
+        if self.slideshow_imagecache:
+            if not imagecache.ImageCache.available():
+                log("Scaled picture cache needs the script.module.pil addon", xbmc.LOGWARNING)
+                return
+            cache_dir = os.path.join(xbmcvfs.translatePath(ADDON.getAddonInfo('profile')), 'imagecache')
+            self.image_cache = imagecache.ImageCache(cache_dir, self.slideshow_imagecache_size * 1024 * 1024,
+                                                     xbmcgui.getScreenWidth(), xbmcgui.getScreenHeight(),
+                                                     workers)
+
+    def _set_missing_files(self):
+        self.missing_files = None
+        if self.slideshow_missingfiles:
+            self.missing_files = missingfiles.MissingFiles(missing_files_path())
+
+    def _set_hash_index(self):
+        self.hash_index = None
+        if self.slideshow_duplicates:
+            if not os.path.exists(hash_index_path()):
+                log("No picture hashes yet, use Update Picture Hashes in the settings", xbmc.LOGWARNING)
+                return
+            self.hash_index = hashindex.HashIndex(hash_index_path())
+
+    def _get_candidates(self):
+        # Get all of the dates or pictures that can be used to start a group
+        if self.slideshow_selectionindex:
+            self._load_selection_index()
+        if self.slideshow_timeline:
+            self._load_timeline()
+        if self.slideshow_filter:
+            # We are going to use a MyPicsDB filter, then get all of the possible pictures we could use to start a group
+            self._get_filtered_pictures() # !SIDE EFFECT! Sets self.slideshow_filter to False on error
+        if not self.slideshow_filter:
+            if self.timeline:
+                # The groups of the timeline are shown in a random order
+                self.timeline_groups = candidates.RandomOrder(self.timeline.group_count())
+            else:
+                # Not using a filter, so get a list of all the unique dates of the images
+                self._get_unique_dates()
+
+    def _load_timeline(self):
+        # Build the timeline of all of the displayable pictures, from the selection index or with a single query
+        started = self.timer.start()
+        pictures_timeline = timeline.Timeline()
+        if self.selection_index:
+            for (epoch, image_id) in self.selection_index.timeline_pictures():
+                pictures_timeline.append(epoch, image_id)
+        else:
+            for (image_id, imgdatetime) in self.database.stream("timeline"):
+                try:
+                    pictures_timeline.append(epoch_seconds(imgdatetime), image_id)
+                except ValueError:
+                    # Not a complete date and time, so its place in the timeline is not known
+                    pass
+        if len(pictures_timeline) == 0:
+            log("No pictures with a date and time for the timeline", xbmc.LOGWARNING)
+            return
+        if self.slideshow_grouping == GROUP_BY_EVENT:
+            event_gap = self.slideshow_eventgap * SECONDS_PER_HOUR
+        else:
+            event_gap = None
+        pictures_timeline.finish(event_gap, self.slideshow_burst_gap, self.slideshow_burst_pictures)
+        self.timeline = pictures_timeline
+        self.timer.stop('timeline', started)
+
+    def _load_selection_index(self):
+        # Open the index of the pictures saved by an earlier screensaver run, or build a new one
+        # if the database has changed since. Without an index, everything is read from the database.
+        index = selectionindex.SelectionIndex(os.path.join(xbmcvfs.translatePath(ADDON.getAddonInfo('profile')), 'selectionindex.bin'))
+        fingerprint = self._get_fingerprint()
+        if not index.open(fingerprint):
+            log("Building the selection index")
+            try:
+                self._build_selection_index(index.path, fingerprint)
+            except (OSError, ValueError) as error:
+                log("Could not build the selection index: %s" %(error), xbmc.LOGWARNING)
+                return
+            if not index.open(fingerprint):
+                return
+        self.selection_index = index
+
+    def _get_fingerprint(self):
+        return database_fingerprint(self._exec_query, self.db_backend)
+
+    def _build_selection_index(self, path, fingerprint):
+        # Read every picture with a date once, in the same order the groups are displayed.
+        # The rows are streamed, so only the much smaller entries of the index are kept in memory.
+        pictures = []
+        for (image_id, imgdatetime, filename) in self.database.stream("selection_index"):
+            try:
+                epoch = epoch_seconds(imgdatetime)
+            except ValueError:
+                # Not a complete date and time, so it can never be part of a burst
+                epoch = 0
+            pictures.append((imgdatetime[0:10], image_id, epoch, filename.lower().endswith(PICTURE_FORMATS)))
+        selectionindex.SelectionIndex.write(path, fingerprint, pictures)
+
+    def _get_filter_matches(self):
+        # Apply the MyPicsDB filter, and return the (folder, file) of the displayable pictures that match it
+        filter_matches = []
+        if self.slideshow_filtername == "":
+            # Use filter selected, but no filter name given
+            message = 'Notification(' + SETTINGS_ERROR + ', ' + NO_FILTER_NAME_ERROR + ', 15000, DefaultIconError.png)'
+            self._show_error(message)
+            self.slideshow_filter = False
+            log("Filter name was not specified",xbmc.LOGERROR)
+        else:
+            # Use filter selected, and filter name specified
+            # Make sure the specified filter exists
+            filter_ids = self._exec_query("filter_id", (self.slideshow_filtername,))
+            if len(filter_ids) != 1:
+                # Filter name was not found in the My Pictures Database.
+                message = 'Notification(' + SETTINGS_ERROR + ', ' + BAD_FILTER_NAME_ERROR%(self.slideshow_filtername) + ', 15000, DefaultIconError.png)'
+                self._show_error(message)
+                self.slideshow_filter = False
+                log("Filtername '%s' not found in MyPictures Database" %(self.slideshow_filtername), xbmc.LOGERROR)
+            else:
+                # Fliter name found, apply it to get the matching pictures.
+                results = self.database.mypicsdb().filterwizard_get_pics_from_filter(self.slideshow_filtername, 0)
+                # Make sure only displayable pictures are used
+                filter_matches = [result for result in results if result[1].lower().endswith(PICTURE_FORMATS)]
+                if len(filter_matches) == 0:
+                    # No matching pictures found for the filter
+                    message = 'Notification(' + SETTINGS_ERROR + ', ' + NO_FILES_MATCH_FILTER%(self.slideshow_filtername) + ', 15000, DefaultIconError.png)'
+                    self._show_error(message)
+                    self.slideshow_filter = False
+                    log("No files match filter '%s'in MyPictures Database" %(self.slideshow_filtername), xbmc.LOGERROR)
+        return filter_matches
+
+    def _get_cached_filter_results(self):
+        # Get the saved (idFile, ImageDateTime) of the pictures that match the filter.
+        # Returns None if there are none, or the filter or the database has changed since they were saved.
+        if not self.slideshow_filtercache or self.slideshow_filtername == "":
+            return None
+        if self.filter_cache_key is None:
+            self.filter_cache_key = (filtercache.filter_definition(self._exec_query, self.slideshow_filtername),
+                                     self._get_fingerprint())
+        (definition, fingerprint) = self.filter_cache_key
+        if definition is None:
+            return None
+        return filtercache.FilterCache(filter_cache_dir()).load(self.slideshow_filtername, definition, fingerprint)
+
+    def _save_filter_results(self, results):
+        # Save the pictures that match the filter for the next time the screensaver starts
+        if not self.slideshow_filtercache or self.filter_cache_key is None or self.filter_cache_key[0] is None:
+            return
+        (definition, fingerprint) = self.filter_cache_key
+        try:
+            filtercache.FilterCache(filter_cache_dir()).save(self.slideshow_filtername, definition, fingerprint, results)
+        except OSError as error:
+            log("Could not save the filter results: %s" %(error), xbmc.LOGWARNING)
+
+    def _get_filtered_pictures(self):
+        # We are going to use a MyPicsDB filter, then get all of the possible pictures we could use to start a group
+        cached_results = self._get_cached_filter_results()
+        if cached_results:
+            # The filter and the database have not changed since the matching pictures were saved
+            completed_filtered_results = cached_results
+        else:
+            filtered_results = self._get_filter_matches()
+            if self.slideshow_filter:
+                # Need to get the idFile number and ImageDateTime for each of the matching images
+                completed_filtered_results = self._resolve_pictures(filtered_results)
+                self._save_filter_results(completed_filtered_results)
+        if self.slideshow_filter:
+            # The pictures that match the filter are used in a random order
+            self.filtered_candidates = candidates.PictureCandidates(completed_filtered_results)
+
+    def _resolve_pictures(self, pictures):
+        return resolve_pictures(self._exec_many, pictures)
+
+    def _get_unique_dates(self):
+        # Not using a filter, so get a list of all the unique dates of the images
+        if self.selection_index:
+            dates = self.selection_index.dates()
+        else:
+            dates = [row[0] for row in self._exec_query("dates")]
+        # The date groups are shown in a random order
+        self.distinct_dates = candidates.DateCandidates(dates)
+
+    def _get_random_date(self):
+        # Cheaply find the date of one random displayable picture, without reading all of the dates.
+        # Returns None if no date was found.
+        (low, high) = self._exec_query("id_range")[0]
+        if low is None:
+            return None
+        for attempt in range(FAST_START_ATTEMPTS):
+            for (chosen_date, filename) in self._exec_query("dates_from", (random.randint(low, high),)):
+                if filename.lower().endswith(PICTURE_FORMATS):
+                    return chosen_date
+        return None
+
+    def _settings_key(self):
+        # Every setting that the choice of the groups and their information fields depend on
+        return [self.slideshow_filter, self.slideshow_filtername, self.slideshow_limit,
+                self.slideshow_burst, self.slideshow_burst_gap, self.slideshow_burst_pictures,
+                self.slideshow_tags, self.slideshow_date, self.slideshow_name,
+                self.slideshow_timeline, self.slideshow_grouping, self.slideshow_eventgap, self.slideshow_duplicates]
+
+    def _prepared_groups_key(self):
+        # Everything that the prepared groups depend on
+        return [self._get_fingerprint()] + self._settings_key()
+
+    def _take_prepared_groups(self):
+        # Get the groups the service prepared while Kodi was idle.
+        # Returns None if there are none, or they were prepared with other settings or another database.
+        store = prepared_groups_store()
+        if not os.path.exists(store.path):
+            return None
+        groups = store.take(self._prepared_groups_key())
+        if groups and self.image_cache:
+            # The service has scaled the pictures already, this finds the scaled copies
+            for (fastmode, picture_group, info_fields) in groups:
+                self.image_cache.prefetch([os.path.join(picture[2], picture[3]) for picture in picture_group])
+        return groups
+
+    def _prepare_first_group(self):
+        # Prepare the first group from a single random date or filter match.
+        # Returns None if there is none, then the first group is chosen the usual way.
+        selected_result = None
+        chosen_date = None
+        if self.slideshow_filter and self._get_cached_filter_results():
+            # The pictures that match the filter are saved, so they can be loaded right away the usual way
+            return None
+        if self.slideshow_filter:
+            if self.slideshow_filtername == "":
+                # The error is shown when the filter is applied the usual way
+                return None
+            # Only a limited number of the matching pictures are read, and a few of them resolved.
+            # The whole filter is applied and resolved after the first group is shown.
+            results = self.database.mypicsdb().filterwizard_get_pics_from_filter(self.slideshow_filtername, FAST_START_FILTER_LIMIT)
+            filter_sample = [result for result in results if result[1].lower().endswith(PICTURE_FORMATS)]
+            resolved = self._resolve_pictures(random.sample(filter_sample, min(len(filter_sample), FAST_START_ATTEMPTS)))
+            if len(resolved) > 0:
+                selected_result = resolved[0]
+                chosen_date = selected_result[1][0:10]
+        else:
+            chosen_date = self._get_random_date()
+        if chosen_date is None:
+            return None
+        return self._prepare_group(self._get_group(chosen_date, selected_result))
+
+    def _write_playlist(self, key, fingerprint, stopped):
+        # Prepare enough groups to play for playlisthours, and save them as the new playlist.
+        # Returns False if stopped() became True before the playlist was complete.
+        started = time.monotonic()
+        self._get_candidates()
+        groups = []
+        duration = 0
+        while duration < self.slideshow_playlist_hours * SECONDS_PER_HOUR:
+            if stopped():
+                return False
+            group = self._prepare_group()
+            if len(group[1]) > 0:
+                groups.append(group)
+            # Every group takes at least one slide, even if its pictures are no longer in the database
+            duration += max(self._group_duration(group), self.slideshow_time)
+        playlist_store().save(key, fingerprint, groups)
+        log("Prepared a playlist of %d groups in %.1f seconds" %(len(groups), time.monotonic() - started))
+        return True
+
+    def _group_duration(self, group):
+        # Seconds it takes to show a group
+        (fastmode, picture_group, info_fields) = group
+        if fastmode:
+            return len(picture_group) * self.slideshow_burst_time / 1000.0
+        return len(picture_group) * self.slideshow_time
+
+    def _prepare_group(self, items=None):
+        # Get the next group of pictures, and everything that is displayed with them
+        started = self.timer.start()
+        queries = self.timer.counts.get('query', 0)
+        for attempt in range(MISSING_GROUP_ATTEMPTS + 1):
+            (fastmode, picture_group) = items or self._get_items()
+            if self.missing_files:
+                missing = self._find_missing(picture_group)
+                picture_group = [picture for picture in picture_group if os.path.join(picture[2], picture[3]) not in missing]
+                (fastmode, picture_group) = self._check_burst(fastmode, picture_group)
+            if len(picture_group) > 0 or items:
+                # A given group (e.g. the first one, chosen before the dates are loaded) is not replaced
+                break
+            # Every picture of the group is missing, try the next group.
+            # A group that is still empty after the last attempt is not displayed.
+        if self.hash_index and not fastmode:
+            picture_group = self._drop_duplicates(picture_group)
+        self.timer.stop('items', started)
+        # Load the tags of the whole group at once, so each picture only reads them from memory
+        self._prefetch_tags(picture_group)
+        info_fields = [self._get_info_fields(picture) for picture in picture_group]
+        if self.image_cache:
+            # Scale the pictures of the group while the groups before it are displayed
+            self.image_cache.prefetch([os.path.join(picture[2], picture[3]) for picture in picture_group])
+        self.timer.stop('prepare', started)
+        self.timer.add('queries', self.timer.counts.get('query', 0) - queries)
+        return (fastmode, picture_group, info_fields)
+
+    def _check_burst(self, fastmode, picture_group):
+        # After pictures were left out, a burst with too few pictures left is displayed as a normal group
+        if fastmode and len(picture_group) < self.slideshow_burst_pictures:
+            return (False, picture_group[0:self.slideshow_limit])
+        return (fastmode, picture_group)
+
+    def _find_missing(self, picture_group):
+        # The paths of the pictures of a group that no longer exist.
+        # The time spent waiting for the checks and the number of missing pictures are part of the timings.
+        started = self.timer.start()
+        missing = self.missing_files.find_missing([os.path.join(picture[2], picture[3]) for picture in picture_group])
+        self.timer.stop('exists', started)
+        self.timer.add('missing', len(missing))
+        return missing
+
+    def _drop_duplicates(self, picture_group):
+        # Leave out the pictures that look almost the same as the picture before them,
+        # so a run of near-duplicates is shown as its first picture
+        hashes = self.hash_index.lookup([picture[0] for picture in picture_group])
+        distances = phash.neighbour_distances([hashes.get(picture[0]) for picture in picture_group])
+        kept = [picture for (picture, distance) in zip(picture_group, distances)
+                if distance is None or distance > DUPLICATE_DISTANCE]
+        self.timer.add('duplicates', len(picture_group) - len(kept))
+        return kept
+
+    def _get_items(self, update=False):
+        if self.slideshow_filter and self.slideshow_filtername != "":
+            # Using a filter
+            # Use the next picture that matched the filter, then get all of the pictures taken on the same date.
+
+            # Choose the date of one of the pictures that match the filter.
+            # No picture is chosen again until all of the pictures have been used.
+            next_selected_result = self.filtered_candidates.next()
+            if self.timeline:
+                position = self.timeline.position(next_selected_result[0])
+                if position is not None:
+                    return self._get_timeline_group(self.timeline.group_at(position), position)
+            chosen_date = next_selected_result[1]
+            return self._get_group(chosen_date, next_selected_result)
+        else:
+            # Not using a filter
+            if self.timeline:
+                # Use the next group of the timeline, starting at a random place when it has more than 'limit' pictures
+                group = self.timeline.group_range(self.timeline_groups.next())
+                (start, end) = group
+                if end - start > self.slideshow_limit:
+                    start += random.randrange(end - start - self.slideshow_limit)
+                return self._get_timeline_group(group, start)
+            # Use the next date in the list of unique dates, then get all of the pictures taken on the same date.
+
+            # Get some random date that at least one of the pictures was taken.
+            # No date is chosen again until all of the dates have been used.
+            chosen_date = self.distinct_dates.next()
+            return self._get_group(chosen_date)
+
+    def _get_timeline_group(self, group, position):
+        # Get the group of pictures to display from a group of the timeline, starting at position.
+        # Only the pictures that are displayed are read from the database.
+        (group_start, group_end) = group
+        fastmode = False
+        (start, end) = (position, min(position + self.slideshow_limit, group_end))
+        if self.slideshow_burst:
+            burst = self.timeline.burst_at(position)
+            if burst:
+                # A burst never goes on into the next group
+                (burst_start, burst_end) = (max(burst[0], group_start), min(burst[1], group_end))
+                if burst_end - burst_start >= self.slideshow_burst_pictures:
+                    # The selected picture is part of a burst, put all of the pictures of the burst in the result
+                    fastmode = True
+                    (start, end) = (burst_start, burst_end)
+        return (fastmode, self._get_pictures(list(self.timeline.image_ids[start:end])))
+
+    def _get_group(self, chosen_date, selected_result=None):
+        # Get the group of pictures to display from the pictures taken on the chosen date.
+        # When selected_result starts with the idFile of a picture that matched the filter, the group starts with it.
+        if self.selection_index:
+            # The index holds the idFile and time of the pictures taken on each date
+            index_pictures = self.selection_index.date_pictures(chosen_date)
+            if index_pictures is not None:
+                return self._get_index_group(chosen_date, index_pictures, selected_result)
+        return self._get_database_group(chosen_date, selected_result)
+
+    def _get_index_group(self, chosen_date, pictures_list, selected_result):
+        # Get the group from the (idFile, epoch) of the displayable pictures taken on the chosen date
+        if selected_result is not None:
+            # Set the offset into the list of pictures to be the picture that matched the filter.
+            offset = 0;
+            for picture in pictures_list:
+                if picture[0] == selected_result[0]:
+                    # file ids are the same
+                    break
+                offset += 1
+        else:
+            # If there are more than 'limit' number of pictures in the list, 
+            # Choose a random place to start in the ordered list of the pictures taken on the chosen date
+            # so we don't always start wtih the earliest picture on the date.
+            if len(pictures_list) > self.slideshow_limit:
+                offset = random.randrange(len(pictures_list) - self.slideshow_limit)
+            else:
+                offset = 0
+
+        # We now have a list of pictures, and an offset into the list of the first picture to display
+        fastmode = False
+        (start, end) = (offset, offset + self.slideshow_limit)
+        if self.slideshow_burst:
+            # Going to look for pictures taken in burst mode
+            burst = self._find_burst(chosen_date, pictures_list, offset, [picture[1] for picture in pictures_list])
+            if burst:
+                # The selected picture is part of a burst, put all of the pictures of the burst in the result
+                fastmode = True
+                (start, end, size) = burst
+        # Only the pictures that are displayed are read from the database
+        return (fastmode, self._get_pictures([picture[0] for picture in pictures_list[start:end]]))
+
+    def _get_database_group(self, chosen_date, selected_result):
+        # Get the group with queries that only return the pictures that are displayed,
+        # and the pictures around them that are needed to find a burst
+        condition = self._date_condition(chosen_date)
+        (kind, parameters) = condition
+        if selected_result is not None:
+            # The offset of the picture that matched the filter is the number of pictures displayed before it
+            offset = self._exec_query(kind + "_offset", (selected_result[0],) + parameters)[0][0]
+        else:
+            # If there are more than 'limit' number of pictures on the date,
+            # choose a random place to start so we don't always start with the earliest picture on the date.
+            count = self._exec_query(kind + "_count", parameters)[0][0]
+            if count > self.slideshow_limit:
+                offset = random.randrange(count - self.slideshow_limit)
+            else:
+                offset = 0
+        if not self.slideshow_burst:
+            return (False, self._get_date_pictures(condition, offset, self.slideshow_limit))
+
+        # Read the group and the pictures around it, until the run of pictures the first one is part of is read completely
+        window = BURST_WINDOW
+        while True:
+            first = max(offset - window, 0)
+            requested = offset - first + self.slideshow_limit + window
+            pictures_list = self._get_date_pictures(condition, first, requested)
+            position = offset - first
+            run = None
+            for (start, end, size) in find_bursts([epoch_seconds(picture[1]) for picture in pictures_list], self.slideshow_burst_gap, 1):
+                if start <= position < end:
+                    run = (start, end, size)
+                    break
+            if run is None:
+                return (False, pictures_list[position:position + self.slideshow_limit])
+            (start, end, size) = run
+            if (start == 0 and first > 0) or (end == len(pictures_list) == requested):
+                # The run may go on before or after the pictures that were read
+                window *= 2
+                continue
+            if size >= self.slideshow_burst_pictures:
+                # The selected picture is part of a burst, put all of the pictures of the burst in the result
+                return (True, pictures_list[start:end])
+            return (False, pictures_list[position:position + self.slideshow_limit])
+
+    def _get_date_pictures(self, condition, offset, count):
+        # Get count of the [idFile, imgdatetime, strPath, strFilename] of the pictures selected by condition,
+        # starting at offset in the order they are displayed
+        (kind, parameters) = condition
+        return self._exec_query(kind + "_pictures", parameters + (count, offset))
+
+    def _get_pictures(self, image_ids):
+        # Get the [idFile, imgdatetime, strPath, strFilename] of pictures, in the same order as image_ids.
+        # Pictures that are no longer in the database are left out.
+        if len(image_ids) == 0:
+            return []
+        rows = self._exec_many("pictures", statements.batches(image_ids, statements.ID_BATCH_SIZE))
+        pictures = dict((picture[0], picture) for picture in rows)
+        return [pictures[image_id] for image_id in image_ids if image_id in pictures]
+
+    def _find_burst(self, chosen_date, pictures_list, offset, epochs):
+        # Find the burst that contains the picture at offset in the pictures taken on the chosen date.
+        # The bursts of a date are found once, and then looked up with a binary search.
+        bursts = self.burst_cache.get(chosen_date)
+        if bursts is None or bursts[0] != len(pictures_list):
+            ranges = find_bursts(epochs, self.slideshow_burst_gap, self.slideshow_burst_pictures)
+            bursts = (len(pictures_list), [burst[0] for burst in ranges], ranges)
+            self.burst_cache.put(chosen_date, bursts)
+        (count, starts, ranges) = bursts
+        index = bisect.bisect_right(starts, offset) - 1
+        if index >= 0 and offset < ranges[index][1]:
+            return ranges[index]
+        return None
+
+    def _date_condition(self, chosen_date):
+        # Get the condition that selects all of the pictures taken on the chosen date: the kind of the
+        # date group statements to use ('date' or 'range', see statements.py) and the parameters bound to it
+        if self.slideshow_daterange:
+            try:
+                next_date = (datetime.strptime(chosen_date, '%Y-%m-%d') + timedelta(days=1)).strftime('%Y-%m-%d')
+                return ('range', (chosen_date, next_date))
+            except ValueError:
+                # Not a real date (e.g. '0000-00-00'), so it can only be matched by the formatted date
+                pass
+        return ('date', (chosen_date,))
+
+    def _check_date_index(self):
+        # Create the index on Files(ImageDateTime, strFilename) if it does not exist yet
+        exists = self._exec_query("date_index_exists", (DATE_INDEX,))
+        if exists[0][0] == 0:
+            log("Creating index %s on Files" %(DATE_INDEX))
+            try:
+                # The queries of the slideshow use a read-only connection
+                self.database.mypicsdb().cur.request(DATE_INDEX_CREATE[self.db_backend] %(DATE_INDEX))
+            except Exception as error:
+                # The database may be read-only for this user, the slideshow still works without the index
+                log("Could not create index %s: %s" %(DATE_INDEX, error), xbmc.LOGWARNING)
+
+    def _get_info_fields(self, picture):
+        # Get the text to display in the information fields for a picture
+        info_fields = {}
+        # Get info to display in text fields
+        if self.slideshow_tags:
+            image_id = picture[0]
+            if image_id not in self.tag_cache:
+                # Not prefetched with its group (or already evicted), so load just this picture
+                self._prefetch_tags([picture])
+            # Keep the tags of interest that are on this image
+            for (name, tag_value) in self.tag_cache.get(image_id, {}).items():
+                info_fields[name] = tag_value
+        if self.slideshow_date:
+            # Display the date the image was taken
+            imgdatetime = picture[1]
+            info_fields['Date'] = time.strftime('%A %B %e, %Y',time.strptime(imgdatetime, '%Y-%m-%d %H:%M:%S'))
+            info_fields['Time'] = time.strftime('%I:%M:%S %p',time.strptime(imgdatetime, '%Y-%m-%d %H:%M:%S'))
+        if self.slideshow_name != DISABLED:
+            if self.slideshow_name == FILENAME:
+                info_fields['File'] = os.path.splitext(picture[3])[0]
+            elif self.slideshow_name == FOLDERNAME:
+                info_fields['Folder'] = os.path.basename(picture[2])
+            elif self.slideshow_name == FOLDER_AND_FILENAME:
+                info_fields['File'] = os.path.splitext(picture[3])[0]
+                info_fields['Folder'] = os.path.basename(picture[2])+'/'
+            elif self.slideshow_name == FULL_PATH:
+                info_fields['File'] = os.path.splitext(picture[3])[0]
+                info_fields['Folder'] = os.path.basename(picture[2])+'/'
+                info_fields['FolderLocation'] = os.path.dirname(picture[2])+'/'
+                info_fields['FileExtension'] = os.path.splitext(picture[3])[1]
+        return info_fields
+
+    def _prefetch_tags(self, picture_group):
+        # Get the tags of interest for all of the pictures in a group with a single query
+        if not self.slideshow_tags:
+            return
+        image_ids = [picture[0] for picture in picture_group if picture[0] not in self.tag_cache]
+        if len(image_ids) == 0:
+            return
+        if self.tag_properties is None:
+            # Get MyPicsDB tagids for the information that can be displayed for each slide,
+            # and map each of them to the window property that displays it
+            tag_types = statements.padded(TAG_TYPES, statements.TAG_TYPE_BATCH_SIZE)
+            self.tag_properties = dict((tag_id, TAG_TYPES[tag_type]) for (tag_id, tag_type) in self._exec_query("tag_types", tag_types))
+        tag_ids = statements.padded(self.tag_properties, statements.TAG_TYPE_BATCH_SIZE)
+        group_tags = dict((image_id, {}) for image_id in image_ids)
+        parameter_rows = [batch + tag_ids for batch in statements.batches(image_ids, statements.ID_BATCH_SIZE)]
+        for (image_id, tag_id, tag_value) in self._exec_many("tags", parameter_rows):
+            group_tags[image_id][self.tag_properties[tag_id]] = tag_value
+        for (image_id, tags) in group_tags.items():
+            self.tag_cache.put(image_id, tags)
+
+    # Utility functions
+    def _exec_query(self, name, parameters=()):
+        started = self.timer.start()
+        results = self.database.execute(name, parameters)
+        self.timer.stop('query', started)
+        return results
+
+    def _exec_many(self, name, parameter_rows):
+        started = self.timer.start()
+        results = self.database.execute_many(name, parameter_rows)
+        self.timer.stop('query', started)
+        return results
+
+    def _show_error(self, message):
+        xbmc.executebuiltin(message)
+
+class Screensaver(Slideshow, xbmcgui.WindowXMLDialog):
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def onInit(self):
+        self.db_backend = xbmcaddon.Addon('plugin.image.mypicsdb2').getSetting('db_backend').lower()
+        # Load variables
+        self._get_vars()
+        # Get addon settings
+        self._get_settings()
+        # Set UI Component information
+        self._set_ui_components()
+        # Set up the cache of pictures scaled to the screen size
+        self._set_image_cache()
+        # Set up the checks for pictures that no longer exist
+        self._set_missing_files()
+        # Open the hashes that find pictures that look almost the same
+        self._set_hash_index()
+        if self.slideshow_dateindex and not self.slideshow_playlist:
+            # Make sure the index used by the date group queries exists
+            self._check_date_index()
+        # Start the show
+        self._start_show()
+
+    def _get_vars(self):
+        # Get the screensaver window id
+        self.winid = xbmcgui.Window(xbmcgui.getCurrentWindowDialogId())
+        # The Screensaver.* properties of the window, only written when they change
+        self.properties = properties.WindowProperties(self.winid)
+        # Init the monitor class to catch onscreensaverdeactivated calls
+        self.Monitor = MyMonitor(action = self._exit)
+        # Set when the show stops, so every wait ends right away
+        self.stop_event = threading.Event()
+        # Groups of pictures are prepared by a worker thread and passed to the display loop through this queue
+        self.group_queue = queue.Queue(GROUP_QUEUE_SIZE)
+        # The thread preparing a new playlist, if one was started
+        self.playlist_writer = None
+        # Paces the bursts to how long decoding their pictures takes on this device
+        self.burst_pacer = scheduler.BurstPacer()
+        Slideshow._get_vars(self)
+        self.next_timing_report = time.monotonic() + TIMING_REPORT_INTERVAL
+        # Set the skin name so we can have different looks for different skins
+        self.winid.setProperty('SkinName',xbmc.getSkinDir())
+
+    def _get_settings(self):
+        Slideshow._get_settings(self)
         # set the dim property
         self._set_prop('Dim', self.slideshow_dim)
         # show music info during slideshow if enabled
@@ -213,83 +988,35 @@ class Screensaver(xbmcgui.WindowXMLDialog):
                 self.image3 = self.getControl(5)
                 self.image4 = self.getControl(6)
         
-    def _get_filtered_pictures(self):
-        # We are going to use a MyPicsDB filter, then get all of the possible pictures we could use to start a group
-        if self.slideshow_filtername == "":
-            # Use filter selected, but no filter name given
-            message = 'Notification(' + SETTINGS_ERROR + ', ' + NO_FILTER_NAME_ERROR + ', 15000, DefaultIconError.png)'
-            xbmc.executebuiltin(message)
-            self.slideshow_filter = False
-            log("Filter name was not specified",xbmc.LOGERROR)
-        else:
-            # Use filter selected, and filter name specified
-            # Make sure the specified filter exists
-            query = "Select pkFilter FROM FilterWizard"
-            query += " WHERE strFilterName = '%s'; " %(self.slideshow_filtername.replace("'","''"))
-            filter_ids = self._exec_query(query)
-            if len(filter_ids) != 1:
-                # Filter name was not found in the My Pictures Database.
-                message = 'Notification(' + SETTINGS_ERROR + ', ' + BAD_FILTER_NAME_ERROR%(self.slideshow_filtername) + ', 15000, DefaultIconError.png)'
-                xbmc.executebuiltin(message)
-                self.slideshow_filter = False
-                log("Filtername '%s' not found in MyPictures Database" %(self.slideshow_filtername), xbmc.LOGERROR)
-            else:
-                # Fliter name found, apply it to get the matching pictures.
-                results = MPDB.filterwizard_get_pics_from_filter(self.slideshow_filtername, 0)
-                # Make sure only displayable pictures are used
-                filtered_results = [result for result in results if result[1].lower().endswith(PICTURE_FORMATS)]
-                if len(filtered_results) == 0:
-                    # No matching pictures found for the filter
-                    message = 'Notification(' + SETTINGS_ERROR + ', ' + NO_FILES_MATCH_FILTER%(self.slideshow_filtername) + ', 15000, DefaultIconError.png)'
-                    xbmc.executebuiltin(message)
-                    self.slideshow_filter = False
-                    log("No files match filter '%s'in MyPictures Database" %(self.slideshow_filtername), xbmc.LOGERROR)
-                else:
-                    # Need to get the idFile number and ImageDateTime for each of the matching images
-                    self.completed_filtered_results = []
-                    for (folder, file) in filtered_results:
-                        query = \
-                            " Select idFile, " + IMGDATETIME[self.db_backend]+ " FROM Files WHERE strPath = '%s' AND strFilename = '%s'; " \
-                            %(folder.replace("'","''"), file.replace("'","''"))
-                        file_info  = self._exec_query(query)
-                        if len(file_info) > 0:
-                            self.completed_filtered_results.append(file_info[0])
-                    # Randomize the sequence of pictures that match the filter
-                    random.shuffle(self.completed_filtered_results)
-                    # At the start of the show, use the first random image idFile
-                    self.filtered_results_index = 0
-
-    def _get_unique_dates(self):
-        # Not using a filter, so get a list of all the unique dates of the images
-        query = " Select DISTINCT " + IMGDATE[self.db_backend] + " FROM Files WHERE ImageDateTime IS NOT NULL AND ImageDateTime != ''; "
-        self.distinct_dates = self._exec_query(query)
-        # Randomize the order that the date groups will be shown
-        random.shuffle(self.distinct_dates)
-        # At the start of the show, use the first random date
-        self.results_index = 0
-
     def _start_show(self):
+        # Prepare the groups of pictures in the background while the current group is displayed
+        self.worker = threading.Thread(target=self._prepare_groups, name='GroupedPicturesWorker')
+        self.worker.start()
         # start with image 1
         current_image_control = self.image1
         order = [1,2]
         effect = self.slideshow_effect
+        # Each slide is shown at a deadline, the time spent preparing it is taken from the time it is displayed
+        slides = scheduler.SlideScheduler(self.stop_event, self.Monitor.abortRequested, self.timer)
         # loop until onScreensaverDeactivated is called
-        while (not self.Monitor.abortRequested()) and (not self.stop):
+        while not self._stopped():
             # Get the next grouping of pictures
-            results = self._get_items()
-            # First element of results is true if the pictures were taken in burst mode
-            fastmode = results[0]
-            # Second element of results is all of the pictures
-            picture_group = results[1] # each element is [idFile, imgdatetime, strPath, strFilename]
+            try:
+                ((fastmode, picture_group, info_fields), on_shown) = self.group_queue.get(timeout=scheduler.POLL_INTERVAL)
+            except queue.Empty:
+                continue
+            if len(picture_group) == 0:
+                # Nothing to display
+                continue
+            # fastmode is true if the pictures were taken in burst mode
+            # each element of picture_group is [idFile, imgdatetime, strPath, strFilename]
+            # each element of info_fields holds the text to display for the picture at the same position
             prev_effect = effect
             if fastmode:
                 # Display this group of pictures quickly
                 effect = FAST
-                timetowait = 1000
-                self._set_prop('Fade1', '0')
-                self._set_prop('Fade2', '0')
-                self._set_prop('NoEffectFade1', '0')
-                self._set_prop('NoEffectFade2', '0')
+                timetowait = self.slideshow_burst_time / 1000.0
+                self.properties.update({'Fade1': '0', 'Fade2': '0', 'NoEffectFade1': '0', 'NoEffectFade2': '0'})
                 self.image1.setAnimations(NO_EFFECT)
                 self.image2.setAnimations(NO_EFFECT)
                 self.image1.setPosition(0,0)
@@ -299,14 +1026,20 @@ class Screensaver(xbmcgui.WindowXMLDialog):
                     self.image4.setVisible(False)
                     
                 # Add picture information to slide for all images in burst mode
-                self._set_prop('FadeinLabel', '0')
-                self._set_prop('FadeoutLabel', '1')
-                xbmc.sleep(1000)
-                self._set_info_fields(picture_group[0])
-                self._set_prop('FadeinLabel', '1')
-                self._set_prop('FadeoutLabel', '0')
+                self.properties.update({'FadeinLabel': '0', 'FadeoutLabel': '1'})
+                if not slides.pause(LABEL_FADE_TIME):
+                    break
+                started = self.timer.start()
+                self._set_info_fields(info_fields[0])
+                self.timer.stop('info', started)
+                self.properties.update({'FadeinLabel': '1', 'FadeoutLabel': '0'})
+                # Leave out frames evenly if this device can not show them as fast as configured
+                burst_size = len(picture_group)
+                (positions, timetowait) = self.burst_pacer.plan(burst_size, timetowait)
+                picture_group = [picture_group[position] for position in positions]
+                info_fields = [info_fields[position] for position in positions]
             else:
-                timetowait = self.slideshow_time * 1000
+                timetowait = self.slideshow_time
                 # Reset effect in case it was in burst mode
                 effect = self.slideshow_effect
                 if self.slideshow_bg:
@@ -314,45 +1047,53 @@ class Screensaver(xbmcgui.WindowXMLDialog):
                     self.image4.setVisible(True)
             self._set_prop('Splash', 'hide')
 
+            # Find the files to show before the first picture is shown, so the loop only has to set them
+            image_names = [self._get_image_names(picture) for picture in picture_group]
+            burst_started = None
+
             # iterate through all the images
-            for picture in picture_group:
-                            
-                img_name = os.path.join(picture[2], picture[3])
+            for ((img_name, background_name), picture_info) in zip(image_names, info_fields):
+                started = self.timer.start()
                 current_image_control.setImage(img_name, False)
+                self.timer.stop('setimage', started)
+                slides.slide_shown()
+                if on_shown is not None:
+                    # The group is on the screen now, e.g. the playlist goes on after it the next time
+                    on_shown()
+                    on_shown = None
+                if fastmode and burst_started is None:
+                    burst_started = time.monotonic()
                 
                 if not fastmode:
                     # add background image to gui
                     if (not self.slideshow_scale) and self.slideshow_bg:
                         if order[0] == 1:
-                            self.image3.setImage(img_name, False)
+                            self.image3.setImage(background_name, False)
                         else:
-                            self.image4.setImage(img_name, False)
+                            self.image4.setImage(background_name, False)
 
                     # Add picture information to slide
-                    self._set_prop('FadeinLabel', '0')
-                    self._set_prop('FadeoutLabel', '1')
-                    xbmc.sleep(1000)
-                    self._set_info_fields(picture)
-                    self._set_prop('FadeinLabel', '1')
-                    self._set_prop('FadeoutLabel', '0')
-
+                    self.properties.update({'FadeinLabel': '0', 'FadeoutLabel': '1'})
+                    if not slides.sleep(LABEL_FADE_TIME):
+                        break
+                    started = self.timer.start()
+                    self._set_info_fields(picture_info)
+                    self.timer.stop('info', started)
+                    self.properties.update({'FadeinLabel': '1', 'FadeoutLabel': '0'})
                     # set animations
                     if effect == CROSSFADE or effect == PANZOOM:
                         # add random slide/zoom anim
                         if effect == PANZOOM:
                             # add random slide/zoom anim
-                            self._anim(current_image_control)
+                            self._anim(current_image_control, timetowait)
                         # add fade anim, used for both fade and slide/zoom anim
-                        self._set_prop('Fade%d' % order[0], '0')
-                        self._set_prop('Fade%d' % order[1], '1')
+                        self.properties.update({'Fade%d' % order[0]: '0', 'Fade%d' % order[1]: '1'})
                     elif effect == NONE:
                         # we need to hide the images when no effect is selected, add fade effect with time=0
-                        self._set_prop('NoEffectFade%d' % order[0], '0')
-                        self._set_prop('NoEffectFade%d' % order[1], '1')
+                        self.properties.update({'NoEffectFade%d' % order[0]: '0', 'NoEffectFade%d' % order[1]: '1'})
                     # add fade anim to background images
                     if self.slideshow_bg and effect != NONE:
-                        self._set_prop('Fade1%d' % order[0], '0')
-                        self._set_prop('Fade1%d' % order[1], '1')
+                        self.properties.update({'Fade1%d' % order[0]: '0', 'Fade1%d' % order[1]: '1'})
 
                 # define next image
                 if current_image_control == self.image1:
@@ -362,195 +1103,182 @@ class Screensaver(xbmcgui.WindowXMLDialog):
                     current_image_control = self.image1
                     order = [1,2]
 
-                # display the image for the specified amount of time
-                count = timetowait
-                while (not self.Monitor.abortRequested()) and (not self.stop) and count > 0:
-                    count -= 1000
-                    if not fastmode:
-                        xbmc.sleep(1000)
-                    else:
-                        xbmc.sleep(self.slideshow_burst_time)
+                # display the image until the deadline of the next one
+                started = self.timer.start()
+                shown = slides.wait_next(timetowait)
+                self.timer.stop('wait', started)
+                self._report_timings()
 
                 # break out of the for loop if onScreensaverDeactivated is called
-                if  self.stop or self.Monitor.abortRequested():
+                if not shown:
                     break
+            else:
+                if fastmode and burst_started is not None:
+                    self._report_burst(burst_size, len(picture_group), timetowait, time.monotonic() - burst_started)
 
-    def _get_items(self, update=False):
-        if self.slideshow_filter and self.slideshow_filtername != "":
-            # Using a filter
-            # Use the next picture that matched the filter, then get all of the pictures taken on the same date.
-            # Set the offset into the list of pictures to be the picture that matched the filter.
+        # Wait for the worker thread to notice that the show has stopped
+        self.worker.join(5)
+        if self.playlist_writer is not None:
+            # Let the playlist writer finish or stop, so it does not write a playlist after the screensaver has gone
+            self.playlist_writer.join(5)
+        if not self.worker.is_alive():
+            # The worker has closed its own connections, only the ones of this thread are left
+            self.database.close()
+        if self.hash_index:
+            self.hash_index.close()
+        if self.missing_files:
+            self.missing_files.shutdown()
+            log("Pictures checked: %d, missing: %d, not checked in time: %d"
+                %(self.missing_files.checked, self.missing_files.dropped, self.missing_files.slow))
 
-            # Choose the date of one of the pictures that match the filter
-            next_selected_result = self.completed_filtered_results[self.filtered_results_index]
-            chosen_date = next_selected_result[1][0:10]
-            # Next time choose the next matching picture
-            self.filtered_results_index += 1
-            if self.filtered_results_index == len(self.completed_filtered_results):
-                # All of the pictures have been used, so start over with a new list of all of the pictures
-                random.shuffle(self.completed_filtered_results)
-                self.filtered_results_index = 0
-            # Get the rest of the images that were taken on the chosen date
-            query = " SELECT idFile, " + IMGDATETIME[self.db_backend] +", strPath, strFilename"
-            query += " FROM Files "
-            query += " WHERE " + IMGDATE[self.db_backend] + " = '%s' " %(chosen_date)
-            query += " ORDER BY ImageDateTime, strFilename "
-            results = self._exec_query(query)
-            # Make sure only displayable pictures are used
-            pictures_list = [result for result in results if result[3].lower().endswith(PICTURE_FORMATS)]
-            # Find the offset in the list of pictures returned of the  picture that matched the query
-            offset = 0;
-            for picture in pictures_list:
-                if picture[0] == next_selected_result[0]:
-                    # file ids are the same
-                    break
-                offset += 1
-        else:
-            # Not using a filter
-            # Use the next date in the list of unique dates, then get all of the pictures taken on the same date.
-            # Set a random offset into the list of pictures so we don't always start wtih the earliest picture on the date.
-
-            # Get some random date that at least one of the pictures was taken (each date is the single element of a list)
-            chosen_date = self.distinct_dates[self.results_index][0]
-            
-            # Next time choose a new date
-            self.results_index += 1
-            if self.results_index == len(self.distinct_dates):
-                # All of the dates have been used, so start over with a new list of all of the dates
-                random.shuffle(self.distinct_dates)
-                self.results_index = 0
-            # Get the rest of the images that were taken on the chosen date
-            query = "SELECT idFile, " + IMGDATETIME[self.db_backend] + ", strPath, strFilename "
-            query += " FROM Files"
-            query += " WHERE " + IMGDATE[self.db_backend] + " = '%s'" %(chosen_date)
-            query += " ORDER BY ImageDateTime, strFilename"
-            results = self._exec_query(query)
-            # Make sure only diplayable pictures are used
-            pictures_list = [result for result in results if result[3].lower().endswith(PICTURE_FORMATS)]
-            # If there are more than 'limit' number of pictures in the list, 
-            # Choose a random place to start in the ordered list of the pictures taken on the chosen date            
-            if len(pictures_list) > self.slideshow_limit:
-                offset = random.randrange(len(pictures_list) - self.slideshow_limit)
-            else:
-                offset = 0
+    def _get_image_names(self, picture):
+        # The files to show for a picture and as its background:
+        # the copies scaled to the screen size and for the background if they are ready, or the original
+        img_name = os.path.join(picture[2], picture[3])
+        if not self.image_cache:
+            return (img_name, img_name)
+        return (self.image_cache.get(img_name) or img_name, self.image_cache.get_background(img_name) or img_name)
 
-        # We now have a list of pictures, and an offset into the list of the first picture to display
-        if self.slideshow_burst:
-            # Going to look for pictures taken in burst mode
-            selected_picture = pictures_list[offset]
-            # find all of the pictures after the selected one, where the time between pictures is no more than 2 seconds
-            selected_image_datetime = selected_picture[1]
-            previous_date_object = datetime.fromtimestamp(time.mktime(time.strptime(selected_image_datetime, '%Y-%m-%d %H:%M:%S')))
-            picture_offset = offset + 1
-            nearby_pictures_after = []
-            while picture_offset < len(pictures_list):
-                next_picture = pictures_list[picture_offset]
-                this_image_datetime = next_picture[1]
-                this_date_object = datetime.fromtimestamp(time.mktime(time.strptime(this_image_datetime, '%Y-%m-%d %H:%M:%S')))
-                datediff = this_date_object - previous_date_object
-                if datediff.total_seconds() <= 2:
-                    nearby_pictures_after.append(pictures_list[picture_offset])
-                    picture_offset += 1
-                    previous_date_object = this_date_object
-                else:
-                    break
-            # find all of the pictures before the selected one, where the time between pictures is no more than 2 seconds
-            next_date_object = datetime.fromtimestamp(time.mktime(time.strptime(selected_image_datetime, '%Y-%m-%d %H:%M:%S')))
-            picture_offset = offset - 1
-            nearby_pictures_before = []
-            while picture_offset >= 0:
-                previous_picture = pictures_list[picture_offset]
-                this_image_datetime = previous_picture[1]
-                this_date_object = datetime.fromtimestamp(time.mktime(time.strptime(this_image_datetime, '%Y-%m-%d %H:%M:%S')))
-                datediff = next_date_object - this_date_object
-                if datediff.total_seconds() <= 2:
-                    nearby_pictures_before.insert(0,pictures_list[picture_offset])
-                    picture_offset -= 1
-                    next_date_object = this_date_object
-                else:
+    def _report_burst(self, burst_size, shown, interval, seconds):
+        # Log how fast a burst was meant to be shown, how fast it was paced and how fast it was shown
+        log("Burst of %d pictures: target %.1f fps, paced %.1f fps, achieved %.1f fps, %d pictures left out"
+            %(burst_size, 1000.0 / self.slideshow_burst_time, 1.0 / interval, shown / seconds, burst_size - shown))
+
+    def _prepare_groups(self):
+        # Runs on the worker thread: keep the queue filled with the next groups of pictures
+        try:
+            if self.slideshow_playlist:
+                # Play the playlist as long as there is one, then choose the groups the usual way
+                self._play_playlist()
+                if self._stopped():
+                    return
+            prepared_groups = self._take_prepared_groups()
+            if prepared_groups:
+                # Show the groups prepared by the service first, and get all of the dates or pictures afterwards
+                for group in prepared_groups:
+                    self._put_group(group)
+            elif self.slideshow_faststart:
+                # Show the first group as soon as one date is known, and get all of the dates or pictures afterwards
+                self._put_group(self._prepare_first_group())
+            self._get_candidates()
+            missing_rounds = 0
+            while not self._stopped():
+                group = self._prepare_group()
+                if len(group[1]) > 0:
+                    missing_rounds = 0
+                    self._put_group(group)
+                    continue
+                # Every picture of the groups of this round is missing, wait a little longer after each such round
+                missing_rounds += 1
+                if missing_rounds >= MISSING_ROUNDS:
+                    message = 'Notification(' + ADDON.getAddonInfo('name') + ', ' + NO_PICTURES_FOUND + ', 15000, DefaultIconError.png)'
+                    self._show_error(message)
+                    log("None of the pictures of the last %d groups were found" %(missing_rounds * (MISSING_GROUP_ATTEMPTS + 1)), xbmc.LOGERROR)
+                    self.stop_event.set()
                     break
-            picture_list = []
-            if len(nearby_pictures_before) > 0 or len(nearby_pictures_after) > 0:
-                # Pictures found that were taken no more than 2 seconds apart
-                # Put all of them in the result
-                picture_list.extend(nearby_pictures_before)
-                picture_list.append(selected_picture)
-                picture_list.extend(nearby_pictures_after)
-                if len(picture_list) > 4:
-                    result = (True,picture_list)
-                else:
-                    result = (False,pictures_list[offset:offset + self.slideshow_limit])
-            else:
-                # Did not find pictures in burst mode near selected picture
-                result = (False,pictures_list[offset:offset + self.slideshow_limit])
-        else:
-            # Not checking for burst mode pictures    
-            result = (False,pictures_list[offset:offset + self.slideshow_limit])
-        return result
-
-    def _set_info_fields(self, picture):
-        self._clear_prop('Headline')
-        self._clear_prop('Caption')
-        self._clear_prop('Sublocation')
-        self._clear_prop('City')
-        self._clear_prop('State')
-        self._clear_prop('Country')
-        self._clear_prop('Date')
-        self._clear_prop('Time')
-        self._clear_prop('FolderLocation')
-        self._clear_prop('Folder')
-        self._clear_prop('File')
-        self._clear_prop('FileExtension')
-        # Get info to display in text fields
-        if self.slideshow_tags:
-            image_id=picture[0]
-            # Get all of the tags that are on this image
-            query = " Select idTagContent FROM TagsInFiles WHERE idFile = '%s'; " %(image_id)
-            content_ids = self._exec_query(query)
-            for content_id in content_ids:
-                # Go through each of the tags, and store the ones of interest
-                query = " Select idTagtype, TagContent FROM TagContents WHERE idTagContent = '%s'; " %(content_id[0])
-                tags =  self._exec_query(query)
-                tag_id = tags[0][0]
-                tag_value = tags[0][1]
-                if tag_id == self.headline_tagid:
-                    self._set_prop('Headline',tag_value)
-                elif tag_id == self.caption_tagid:
-                    self._set_prop('Caption',tag_value)
-                elif tag_id == self.sublocation_tagid:
-                    self._set_prop('Sublocation',tag_value)
-                elif tag_id == self.city_tagid:
-                    self._set_prop('City',tag_value)
-                elif tag_id == self.state_tagid:
-                    self._set_prop('State',tag_value)
-                elif tag_id == self.country_tagid:
-                    self._set_prop('Country',tag_value)
-        if self.slideshow_date:
-            # Display the date the image was taken
-            imgdatetime = picture[1]
-            self._set_prop('Date',time.strftime('%A %B %e, %Y',time.strptime(imgdatetime, '%Y-%m-%d %H:%M:%S')))
-            self._set_prop('Time',time.strftime('%I:%M:%S %p',time.strptime(imgdatetime, '%Y-%m-%d %H:%M:%S')))
-        if self.slideshow_name != DISABLED:
-            if self.slideshow_name == FILENAME:
-                self._set_prop('File',os.path.splitext(picture[3])[0])
-            elif self.slideshow_name == FOLDERNAME:
-                self._set_prop('Folder',os.path.basename(picture[2]))
-            elif self.slideshow_name == FOLDER_AND_FILENAME:
-                self._set_prop('File',os.path.splitext(picture[3])[0])
-                self._set_prop('Folder',os.path.basename(picture[2])+'/')
-            elif self.slideshow_name == FULL_PATH:
-                self._set_prop('File',os.path.splitext(picture[3])[0])
-                self._set_prop('Folder',os.path.basename(picture[2])+'/')
-                self._set_prop('FolderLocation',os.path.dirname(picture[2])+'/')
-                self._set_prop('FileExtension',os.path.splitext(picture[3])[1])
+                self.stop_event.wait(MISSING_ROUND_PAUSE * 2 ** (missing_rounds - 1))
+        except Exception:
+            # Without new groups the show can not continue
+            log("Could not prepare the next group of pictures: %s" %(traceback.format_exc()), xbmc.LOGERROR)
+            self.stop_event.set()
+        finally:
+            if self.selection_index:
+                self.selection_index.close()
+            self.database.close_thread()
+
+    def _play_playlist(self):
+        # Runs on the worker thread: put the groups of the playlist in the queue, without any queries.
+        # A new playlist is prepared on another thread when this one is nearly used up, or was prepared
+        # from a database that has changed since. Returns when there are no groups left to play.
+        store = playlist_store()
+        key = self._settings_key()
+        if not store.open(key) or store.remaining() == 0:
+            log("No playlist to play, preparing a new one")
+            self._start_playlist_writer(None)
+            return
+        self._start_playlist_writer(store)
+        while not self._stopped():
+            if store.replaced():
+                # Go on with the new playlist
+                if not store.open(key):
+                    return
+            item = store.next()
+            if item is None:
+                return
+            (group, position) = item
+            if self.missing_files:
+                # Leave out the pictures that no longer exist, and their information fields
+                missing = self._find_missing(group[1])
+                if missing:
+                    present = [index for (index, picture) in enumerate(group[1]) if os.path.join(picture[2], picture[3]) not in missing]
+                    (fastmode, picture_group) = self._check_burst(group[0], [group[1][index] for index in present])
+                    group = (fastmode, picture_group, [group[2][index] for index in present][0:len(picture_group)])
+            if store.remaining() == PLAYLIST_REFILL_GROUPS:
+                self._start_playlist_writer(None)
+            if self.image_cache:
+                self.image_cache.prefetch([os.path.join(picture[2], picture[3]) for picture in group[1]])
+            self._put_group(group, functools.partial(store.save_position, position))
+
+    def _start_playlist_writer(self, store):
+        # Prepare a new playlist on its own thread and database connections.
+        # With store, only if it has few groups left or its database has changed.
+        # Only one playlist is prepared at a time.
+        if self.playlist_writer is not None and self.playlist_writer.is_alive():
+            return
+        writer = PlaylistWriter(self.db_backend, self._stopped)
+        self.playlist_writer = threading.Thread(target=writer.run, args=(store,), name='GroupedPicturesPlaylistWriter')
+        self.playlist_writer.start()
 
-    def _anim(self, current_image_control):
+    def _put_group(self, group, on_shown=None):
+        # Wait for room in the queue, but give up as soon as the show stops.
+        # A group without pictures, e.g. because all of them are missing, is left out.
+        # on_shown is called by the display thread when the first picture of the group is shown.
+        if group is not None and len(group[1]) == 0:
+            return
+        if group is not None and group[0]:
+            self._preload_burst(group[1])
+        while (group is not None) and (not self._stopped()):
+            try:
+                self.group_queue.put((group, on_shown), timeout=scheduler.POLL_INTERVAL)
+                break
+            except queue.Full:
+                continue
+
+    def _preload_burst(self, picture_group):
+        # Runs on the worker thread: have the scaled copies of a burst ready before it is queued, and decode
+        # its first pictures to measure how fast this device can show them
+        paths = [os.path.join(picture[2], picture[3]) for picture in picture_group]
+        if self.image_cache:
+            self.image_cache.prefetch(paths)
+            deadline = time.monotonic() + BURST_PRELOAD_TIME
+            while self.image_cache.busy(paths) and time.monotonic() < deadline and not self._stopped():
+                self.stop_event.wait(scheduler.POLL_INTERVAL)
+        size = (xbmcgui.getScreenWidth(), xbmcgui.getScreenHeight())
+        for picture in picture_group[0:BURST_DECODE_SAMPLES]:
+            if self._stopped():
+                return
+            try:
+                seconds = imagecache.decode_time(self._get_image_names(picture)[0], size)
+            except Exception as error:
+                # Logged once for the burst, the pace is kept as it is
+                log("Could not decode %s: %s" %(os.path.join(picture[2], picture[3]), error), xbmc.LOGWARNING)
+                return
+            if seconds is None:
+                # Without Pillow the pictures can not be decoded here, every frame is shown
+                return
+            self.burst_pacer.frame_decoded(seconds)
+
+    def _set_info_fields(self, info_fields):
+        # Display the information fields of a picture, and clear the ones it does not have
+        self.properties.update(dict((name, info_fields.get(name)) for name in INFO_FIELDS))
+
+    def _anim(self, current_image_control, period):
         # pick a random anim
         number = random.randint(0,8)
         posx = 0
         posy = 0
-        # add 1 sec fadeout time to showtime
-        anim_time = self.slideshow_time + 1
+        # the picture moves for the period the scheduler displays it, which already includes the label fade
+        anim_time = period
         # set zoom level depending on the anim time
         zoom = 110 + anim_time
         if number == 1 or number == 5 or number == 7:
@@ -570,41 +1298,64 @@ class Screensaver(xbmcgui.WindowXMLDialog):
             current_image_control.setAnimations(eval(EFFECTLIST[number] % (zoom, zoom)))
 
     # Utility functions
-    def _exec_query(self,query):
-        return MPDB.cur.request(query)
+    def _report_timings(self):
+        # Show the timings of the slideshow phases on the screen, and write them to the log now and then
+        if not self.timer.enabled:
+            return
+        lines = self.timer.summary_lines()
+        self._set_prop('Timings', '[CR]'.join(lines))
+        if time.monotonic() >= self.next_timing_report:
+            self.next_timing_report = time.monotonic() + TIMING_REPORT_INTERVAL
+            log("Timings in ms (queries per group)\n" + "\n".join(lines))
 
-    def _set_prop(self, name, value):
-        self.winid.setProperty('Screensaver.%s' % name, value)
+    def _stopped(self):
+        return self.stop_event.is_set() or self.Monitor.abortRequested()
 
-    def _clear_prop(self, name):
-        self.winid.clearProperty('Screensaver.%s' % name)
+    def _set_prop(self, name, value):
+        self.properties.set(name, value)
 
     def _exit(self):
         # exit when onScreensaverDeactivated gets called
-        self.stop = True
-        # clear our properties on exit
-        self._clear_prop('Fade1')
-        self._clear_prop('Fade2')
-        self._clear_prop('Fade11')
-        self._clear_prop('Fade12')
-        self._clear_prop('Dim')
-        self._clear_prop('Music')
-        self._clear_prop('Clock')
-        self._clear_prop('Splash')
-        self._clear_prop('Background')
-        self._clear_prop('Headline')
-        self._clear_prop('Caption')
-        self._clear_prop('Sublocation')
-        self._clear_prop('City')
-        self._clear_prop('State')
-        self._clear_prop('Country')
-        self._clear_prop('Date')
-        self._clear_prop('Time')
-        self._clear_prop('Folder')
-        self._clear_prop('File')
-        MPDB.cur.close()
+        self.stop_event.set()
+        # clear every property that was set
+        self.properties.close()
+        if self.image_cache:
+            self.image_cache.shutdown()
         self.close()
 
+class PlaylistWriter(Slideshow):
+    # Prepares a new playlist with the current settings, beside the screensaver or from makeplaylist.py
+    def __init__(self, db_backend, stopped=None):
+        self.db_backend = db_backend
+        self.stopped = stopped or (lambda: False)
+
+    def run(self, store=None):
+        # Returns True if there is a playlist to play
+        self.image_cache = None
+        self.missing_files = None
+        self.hash_index = None
+        self._get_vars()
+        try:
+            self._get_settings()
+            self._set_missing_files()
+            self._set_hash_index()
+            key = self._settings_key()
+            fingerprint = list(self._get_fingerprint())
+            if store is not None and store.fingerprint == fingerprint and store.remaining() > PLAYLIST_REFILL_GROUPS:
+                return True
+            return self._write_playlist(key, fingerprint, self.stopped)
+        except Exception:
+            log("Could not prepare the playlist: %s" %(traceback.format_exc()), xbmc.LOGERROR)
+            return False
+        finally:
+            if self.missing_files:
+                self.missing_files.shutdown()
+            if self.hash_index:
+                self.hash_index.close()
+            if self.selection_index:
+                self.selection_index.close()
+            self.database.close()
+
 # Notify when screensaver is to stop
 class MyMonitor(xbmc.Monitor):
     def __init__(self, *args, **kwargs):
@@ -0,0 +1,129 @@
+# *  This Program is free software; you can redistribute it and/or modify
+# *  it under the terms of the GNU General Public License as published by
+# *  the Free Software Foundation; either version 2, or (at your option)
+# *  any later version.
+# *
+# *  This Program is distributed in the hope that it will be useful,
+# *  but WITHOUT ANY WARRANTY; without even the implied warranty of
+# *  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# *  GNU General Public License for more details.
+# *
+# *  You should have received a copy of the GNU General Public License
+# *  along with Kodi; see the file COPYING.  If not, write to
+# *  the Free Software Foundation, 675 Mass Ave, Cambridge, MA 02139, USA.
+# *  http://www.gnu.org/copyleft/gpl.html
+
+# Index of the pictures in the My Pictures Database, stored in the addon profile folder.
+# The screensaver is started many times a day, and the index lets it choose dates and groups
+# without reading all of the dates from the database each time.
+# The index is only used while the fingerprint of the database it was built from still matches.
+
+### File layout (little-endian, every section starts at a multiple of 8 bytes)
+
+#  Header:   magic, version, backend, row count, max idFile, number of dates, number of pictures
+#  Dates:    one entry per date, sorted by date: date, first picture, pictures, displayable pictures
+#  Pictures: idFile of all pictures as int64, sorted by ImageDateTime and strFilename
+#            ImageDateTime of all pictures as int64 epoch seconds
+#            1 for each picture with a displayable extension, 0 otherwise, as uint8
+
+import mmap
+import os
+import struct
+
+from lib import atomicfile
+
+MAGIC = b'GPSI'
+VERSION = 1
+HEADER = struct.Struct('<4sI8sqqQQ')
+DATE_ENTRY = struct.Struct('<10s6xQQQ')
+
+class SelectionIndex(object):
+    def __init__(self, path):
+        self.path = path
+        self.file = None
+        self.map = None
+        self.views = []
+        # date -> (first picture, pictures, displayable pictures)
+        self.date_entries = {}
+
+    @staticmethod
+    def write(path, fingerprint, pictures):
+        # Write a new index. pictures is a list of (date, idFile, epoch, displayable) sorted by
+        # ImageDateTime and strFilename, fingerprint is (backend, row count, max idFile).
+        (backend, row_count, max_id) = fingerprint
+        dates = []
+        for (index, picture) in enumerate(pictures):
+            if len(dates) == 0 or dates[-1][0] != picture[0]:
+                dates.append([picture[0], index, 0, 0])
+            dates[-1][2] += 1
+            dates[-1][3] += 1 if picture[3] else 0
+        with atomicfile.replace(path, 'wb') as index_file:
+            index_file.write(HEADER.pack(MAGIC, VERSION, backend.encode('ascii'), row_count, max_id, len(dates), len(pictures)))
+            for (date, start, count, displayable) in dates:
+                index_file.write(DATE_ENTRY.pack(date.encode('ascii'), start, count, displayable))
+            index_file.write(struct.pack('<%dq' %(len(pictures)), *[picture[1] for picture in pictures]))
+            index_file.write(struct.pack('<%dq' %(len(pictures)), *[picture[2] for picture in pictures]))
+            index_file.write(bytes(1 if picture[3] else 0 for picture in pictures))
+
+    def open(self, fingerprint):
+        # Map the index into memory. Returns False if there is no index, or it was built from a different database.
+        self.close()
+        if not os.path.exists(self.path):
+            return False
+        self.file = open(self.path, 'rb')
+        try:
+            self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Empty file
+            self.close()
+            return False
+        (backend, row_count, max_id) = fingerprint
+        if len(self.map) < HEADER.size:
+            self.close()
+            return False
+        (magic, version, index_backend, index_rows, index_max_id, date_count, picture_count) = HEADER.unpack_from(self.map, 0)
+        if (magic, version, index_backend.rstrip(b'\0'), index_rows, index_max_id) != \
+                (MAGIC, VERSION, backend.encode('ascii'), row_count, max_id):
+            self.close()
+            return False
+        for number in range(date_count):
+            (date, start, count, displayable) = DATE_ENTRY.unpack_from(self.map, HEADER.size + number * DATE_ENTRY.size)
+            self.date_entries[date.decode('ascii')] = (start, count, displayable)
+        # Typed views of the picture arrays, without copying them out of the mapped file
+        offset = HEADER.size + date_count * DATE_ENTRY.size
+        data = memoryview(self.map)
+        self.views.append(data)
+        self.ids = data[offset:offset + 8 * picture_count].cast('q')
+        self.epochs = data[offset + 8 * picture_count:offset + 16 * picture_count].cast('q')
+        self.displayable = data[offset + 16 * picture_count:offset + 17 * picture_count]
+        self.views.extend([self.ids, self.epochs, self.displayable])
+        return True
+
+    def close(self):
+        for view in reversed(self.views):
+            view.release()
+        self.views = []
+        self.date_entries = {}
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def dates(self):
+        # All of the dates that have at least one displayable picture
+        return [date for (date, entry) in self.date_entries.items() if entry[2] > 0]
+
+    def date_pictures(self, date):
+        # The (idFile, epoch) of the displayable pictures taken on a date, in display order.
+        # Returns None if the date is not in the index.
+        if date not in self.date_entries:
+            return None
+        (start, count, displayable) = self.date_entries[date]
+        return [(self.ids[index], self.epochs[index]) for index in range(start, start + count) if self.displayable[index]]
+
+    def timeline_pictures(self):
+        # The (epoch, idFile) of all of the displayable pictures with a complete date and time, in display order
+        return ((self.epochs[index], self.ids[index]) for index in range(len(self.ids))
+                if self.displayable[index] and self.epochs[index] != 0)
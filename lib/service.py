@@ -0,0 +1,158 @@
+# *  This Program is free software; you can redistribute it and/or modify
+# *  it under the terms of the GNU General Public License as published by
+# *  the Free Software Foundation; either version 2, or (at your option)
+# *  any later version.
+# *
+# *  This Program is distributed in the hope that it will be useful,
+# *  but WITHOUT ANY WARRANTY; without even the implied warranty of
+# *  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# *  GNU General Public License for more details.
+# *
+# *  You should have received a copy of the GNU General Public License
+# *  along with Kodi; see the file COPYING.  If not, write to
+# *  the Free Software Foundation, 675 Mass Ave, Cambridge, MA 02139, USA.
+# *  http://www.gnu.org/copyleft/gpl.html
+
+# Service that prepares the screensaver while Kodi is idle, enabled by the service setting.
+# When nothing is playing and there has been no user input for a while, but the screensaver has not
+# started yet, the service updates the selection index and the saved filter pictures, prepares the
+# first groups of pictures with their information fields, and scales their pictures for the image cache.
+# Kodi counts as idle after a share of the time it waits before it starts the screensaver, so the preparation
+# is done by the time the screensaver starts.
+# The work is done in small steps with pauses in between, and stops as soon as Kodi is no longer idle,
+# also in the middle of a long step such as rebuilding the selection index.
+
+import json
+import traceback
+
+import xbmc
+import xbmcaddon
+
+from lib import database
+from lib import screensaver
+
+# Seconds between checks whether Kodi is idle
+CHECK_INTERVAL = 30
+# Share of the screensaver wait time without user input after which Kodi counts as idle
+IDLE_SHARE = 0.5
+# Seconds without user input before Kodi counts as idle, if the screensaver wait time can not be read
+IDLE_TIME = 60
+SECONDS_PER_MINUTE = 60
+# Seconds of rest between the steps of the preparation
+STEP_PAUSE = 2
+# Threads that scale pictures for the image cache, fewer than the screensaver uses
+IMAGE_CACHE_WORKERS = 1
+# Seconds the prepared groups are trusted to match the database, before its fingerprint is queried again
+FINGERPRINT_CHECK_INTERVAL = 600
+
+def setting_value(setting):
+    # The value of a Kodi setting, None if it can not be read
+    request = {'jsonrpc': '2.0', 'method': 'Settings.GetSettingValue', 'params': {'setting': setting}, 'id': 1}
+    try:
+        response = json.loads(xbmc.executeJSONRPC(json.dumps(request)))
+        return response['result']['value']
+    except (ValueError, KeyError, TypeError):
+        return None
+
+def screensaver_selected():
+    # True if this addon is the screensaver Kodi starts
+    return setting_value('screensaver.mode') == xbmcaddon.Addon().getAddonInfo('id')
+
+def idle_time():
+    # Seconds without user input before Kodi counts as idle, a share of the minutes Kodi waits before it
+    # starts the screensaver
+    minutes = setting_value('screensaver.time')
+    if not isinstance(minutes, int) or minutes <= 0:
+        return IDLE_TIME
+    return int(minutes * SECONDS_PER_MINUTE * IDLE_SHARE)
+
+def kodi_idle(seconds):
+    # True if the user has not done anything for seconds, nothing is playing and the screensaver is not running
+    return xbmc.getGlobalIdleTime() >= seconds and \
+           not xbmc.Player().isPlaying() and \
+           not xbmc.getCondVisibility('System.ScreenSaverActive')
+
+class Preparer(screensaver.Slideshow):
+    # Prepares the groups the screensaver starts with, using the same code and settings as the screensaver
+    def __init__(self, monitor, idle_seconds):
+        self.monitor = monitor
+        self.idle_seconds = idle_seconds
+
+    def run(self):
+        self.db_backend = xbmcaddon.Addon('plugin.image.mypicsdb2').getSetting('db_backend').lower()
+        self.image_cache = None
+        self.missing_files = None
+        self.hash_index = None
+        self._get_vars()
+        # Long queries, e.g. those that rebuild the selection index, stop as soon as Kodi is no longer idle
+        self.database.interrupted = self._interrupted
+        try:
+            self._get_settings()
+            store = screensaver.prepared_groups_store()
+            if store.recent(self._settings_key(), FINGERPRINT_CHECK_INTERVAL):
+                # The groups prepared earlier have not been used yet, and the database had not changed a moment ago
+                return
+            key = self._prepared_groups_key()
+            if store.ready(key):
+                # The groups prepared earlier have not been used yet
+                store.checked(key)
+                return
+            # Only open what the preparation needs once there is work to do
+            self._set_missing_files()
+            self._set_hash_index()
+            screensaver.log("Preparing the screensaver while Kodi is idle")
+            if not self._rest():
+                return
+            # Update the selection index and the saved filter pictures, and choose the dates or pictures
+            self._get_candidates()
+            self._set_image_cache(IMAGE_CACHE_WORKERS)
+            groups = []
+            for number in range(screensaver.PREPARED_GROUPS):
+                if not self._rest():
+                    return
+                # Also starts scaling the pictures of the group for the image cache
+                group = self._prepare_group()
+                if len(group[1]) > 0:
+                    groups.append(group)
+            store.save(key, groups)
+            # Let the pictures be scaled while Kodi stays idle
+            while self.image_cache and self.image_cache.pending and self._rest():
+                pass
+        except database.Interrupted:
+            screensaver.log("Stopped preparing the screensaver, Kodi is no longer idle")
+        finally:
+            if self.image_cache:
+                self.image_cache.shutdown()
+            if self.missing_files:
+                self.missing_files.shutdown()
+            if self.hash_index:
+                self.hash_index.close()
+            if self.selection_index:
+                self.selection_index.close()
+            self.database.close()
+
+    def _show_error(self, message):
+        # The error is logged, and shown by the screensaver when it starts
+        pass
+
+    def _rest(self):
+        # Pause between two steps. Returns False if Kodi is shutting down or is no longer idle.
+        if self.monitor.waitForAbort(STEP_PAUSE):
+            return False
+        return kodi_idle(self.idle_seconds)
+
+    def _interrupted(self):
+        return self.monitor.abortRequested() or not kodi_idle(self.idle_seconds)
+
+def run():
+    monitor = xbmc.Monitor()
+    while not monitor.waitForAbort(CHECK_INTERVAL):
+        if not xbmcaddon.Addon().getSettingBool('service'):
+            continue
+        idle_seconds = idle_time()
+        if not kodi_idle(idle_seconds) or not screensaver_selected():
+            continue
+        try:
+            Preparer(monitor, idle_seconds).run()
+        except Exception:
+            screensaver.log("Could not prepare the screensaver: %s" %(traceback.format_exc()), xbmc.LOGERROR)
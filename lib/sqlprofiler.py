@@ -0,0 +1,133 @@
+# *  This Program is free software; you can redistribute it and/or modify
+# *  it under the terms of the GNU General Public License as published by
+# *  the Free Software Foundation; either version 2, or (at your option)
+# *  any later version.
+# *
+# *  This Program is distributed in the hope that it will be useful,
+# *  but WITHOUT ANY WARRANTY; without even the implied warranty of
+# *  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# *  GNU General Public License for more details.
+# *
+# *  You should have received a copy of the GNU General Public License
+# *  along with Kodi; see the file COPYING.  If not, write to
+# *  the Free Software Foundation, 675 Mass Ave, Cambridge, MA 02139, USA.
+# *  http://www.gnu.org/copyleft/gpl.html
+
+# Profile of the queries to the My Pictures Database, enabled by the sqlprofile setting.
+# Queries are grouped by their shape: the text with the numbers and strings taken out, so the query for
+# every date or every group of pictures counts as the same statement. For each shape the number of runs,
+# the time, the rows and the bytes returned are added up. Queries slower than a threshold are logged.
+# The summary is written to the Kodi log when the connections are closed, with the query plans of the slow
+# shapes whose slowest run took the longest, which show when a query no longer uses an index. A plan is
+# captured with the parameters of that slowest run.
+
+import re
+import threading
+
+import xbmc
+
+# Shapes whose query plan is captured, the slow ones whose slowest run took the longest
+MAX_PLANS = 10
+# Shapes listed in the summary, the ones that took the most time in total
+SUMMARY_SHAPES = 15
+# Bytes counted for a number in a result row
+NUMBER_BYTES = 8
+
+STRING_PATTERN = re.compile(r"'(?:[^']|'')*'")
+NUMBER_PATTERN = re.compile(r"\b\d+(?:\.\d+)?\b")
+LIST_PATTERN = re.compile(r"\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)", re.IGNORECASE)
+SPACE_PATTERN = re.compile(r"\s+")
+
+# Statement to get the query plan of a SELECT
+EXPLAIN = {"mysql"  : "EXPLAIN %s",
+           "sqlite" : "EXPLAIN QUERY PLAN %s"}
+
+def statement_shape(query):
+    # The query with its strings and numbers replaced by ?, and IN lists of any length by IN (...)
+    shape = STRING_PATTERN.sub('?', query)
+    shape = NUMBER_PATTERN.sub('?', shape)
+    shape = LIST_PATTERN.sub('IN (...)', shape)
+    return SPACE_PATTERN.sub(' ', shape).strip().rstrip(';').strip()
+
+def result_bytes(rows):
+    # Approximate size of the values of a result
+    size = 0
+    for row in rows:
+        for value in row:
+            if isinstance(value, (str, bytes)):
+                size += len(value)
+            elif value is not None:
+                size += NUMBER_BYTES
+    return size
+
+class ShapeStats(object):
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+        self.rows = 0
+        self.bytes = 0
+        # (query, parameters) of the slowest run, to capture the query plan with
+        self.slowest = None
+        # Lines of the query plan, None until captured
+        self.plan = None
+
+class SqlProfiler(object):
+    def __init__(self, db_backend, slow_ms):
+        self.db_backend = db_backend
+        self.slow_seconds = slow_ms / 1000.0
+        self.lock = threading.Lock()
+        # shape -> ShapeStats
+        self.shapes = {}
+
+    def record(self, query, parameters, seconds, row_count, byte_count):
+        # Add a query that took seconds and returned row_count rows of byte_count bytes, and log it if it was slow
+        shape = statement_shape(query)
+        with self.lock:
+            stats = self.shapes.get(shape)
+            if stats is None:
+                stats = self.shapes[shape] = ShapeStats()
+            stats.count += 1
+            stats.seconds += seconds
+            if stats.slowest is None or seconds > stats.max_seconds:
+                stats.max_seconds = seconds
+                stats.slowest = (query, parameters)
+            stats.rows += row_count
+            stats.bytes += byte_count
+        if seconds >= self.slow_seconds:
+            xbmc.log("[SqlProfiler] Slow query, %.1f ms, %d rows, %d bytes: %s"
+                     %(seconds * 1000.0, row_count, byte_count, shape), xbmc.LOGWARNING)
+
+    def wanted_plans(self):
+        # (query, parameters) of the slowest run of the slow SELECT shapes to capture the query plan of:
+        # at most MAX_PLANS of them, the ones whose slowest run took the longest
+        with self.lock:
+            slow = [stats for (shape, stats) in self.shapes.items()
+                    if stats.max_seconds >= self.slow_seconds and shape.upper().startswith('SELECT')]
+        slow.sort(key=lambda stats: stats.max_seconds, reverse=True)
+        return [stats.slowest for stats in slow[:MAX_PLANS] if stats.plan is None]
+
+    def explain_statement(self, query):
+        return EXPLAIN[self.db_backend] %(query.strip().rstrip(';'))
+
+    def add_plan(self, query, plan_rows):
+        # Keep the query plan of the shape of query, it is written to the log with the summary
+        lines = [' | '.join(str(value) for value in row) for row in plan_rows]
+        with self.lock:
+            self.shapes[statement_shape(query)].plan = lines
+
+    def summary_lines(self):
+        # The shapes that took the most time in total, with their query plan if it was captured
+        with self.lock:
+            shapes = sorted(self.shapes.items(), key=lambda item: item[1].seconds, reverse=True)[:SUMMARY_SHAPES]
+            lines = []
+            for (shape, stats) in shapes:
+                lines.append('n=%-6d total=%9.1f ms max=%8.1f ms rows=%-8d bytes=%-10d %s'
+                             %(stats.count, stats.seconds * 1000.0, stats.max_seconds * 1000.0, stats.rows, stats.bytes, shape))
+                for plan_line in stats.plan or []:
+                    lines.append('    plan: ' + plan_line)
+        return lines
+
+    def log_summary(self):
+        if len(self.shapes) > 0:
+            xbmc.log("[SqlProfiler] Queries by total time (%s)\n%s" %(self.db_backend, '\n'.join(self.summary_lines())), xbmc.LOGINFO)
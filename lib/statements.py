@@ -0,0 +1,138 @@
+# *  This Program is free software; you can redistribute it and/or modify
+# *  it under the terms of the GNU General Public License as published by
+# *  the Free Software Foundation; either version 2, or (at your option)
+# *  any later version.
+# *
+# *  This Program is distributed in the hope that it will be useful,
+# *  but WITHOUT ANY WARRANTY; without even the implied warranty of
+# *  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# *  GNU General Public License for more details.
+# *
+# *  You should have received a copy of the GNU General Public License
+# *  along with Kodi; see the file COPYING.  If not, write to
+# *  the Free Software Foundation, 675 Mass Ave, Cambridge, MA 02139, USA.
+# *  http://www.gnu.org/copyleft/gpl.html
+
+# The statements this addon runs on the My Pictures Database, by name.
+# Values are never formatted into the text of a statement, they are bound to its ? parameters. So every run of
+# a statement has the same text, which sqlite compiles only once per connection (the sqlite3 module keeps the
+# compiled statements by their text), and which is also the same statement for the mysql server.
+# Lists of values (e.g. the idFile numbers of a group) are bound in batches of a fixed size, padded with NULL,
+# so a list of any length also uses a single statement.
+# On mysql the statements are run by MyPicsDB, which changes the ? parameters into those of its driver.
+
+# DateTimes are stored and retreived differently between mysql and sqlite.
+IMGDATE =     {"mysql" :"DATE_FORMAT(ImageDateTime,'%Y-%m-%d')",
+               "sqlite":"SUBSTR(ImageDateTime, 0, 11)"}
+IMGDATETIME = {"mysql" :"DATE_FORMAT(ImageDateTime,'%Y-%m-%d %T')",
+               "sqlite":"ImageDateTime"}
+
+# Formats that can be displayed in a slideshow
+PICTURE_FORMATS = ('bmp', 'jpeg', 'jpg', 'gif', 'png', 'tiff', 'mng', 'ico', 'pcx', 'tga')
+# The same test as strFilename.lower().endswith(PICTURE_FORMATS), done by the database
+PICTURE_CONDITION = "(" + " OR ".join("LOWER(strFilename) LIKE '%%%s'" %(picture_format) for picture_format in PICTURE_FORMATS) + ")"
+
+# Number of idFile numbers bound to one statement
+ID_BATCH_SIZE = 50
+# Number of (folder, file) pairs bound to one statement, two parameters each.
+# Older sqlite versions allow no more than 999 parameters in a statement.
+PAIR_BATCH_SIZE = 200
+# Number of tag types bound to one statement, at least the number of TAG_TYPES of the screensaver
+TAG_TYPE_BATCH_SIZE = 8
+
+# Selects all of the pictures taken on one date, bound to the date
+DATE_CONDITION = "{imgdate} = ?"
+# Selects all of the pictures taken on one date with a half-open range on ImageDateTime, bound to the date and the next date.
+# Unlike comparing IMGDATE, the column is not wrapped in a function, so an index on ImageDateTime can be used.
+RANGE_CONDITION = "ImageDateTime >= ? AND ImageDateTime < ?"
+
+# Statements that return the pictures of a date group, with {date} being DATE_CONDITION or RANGE_CONDITION
+DATE_GROUP_STATEMENTS = {
+    # Number of pictures in the group
+    "count": "SELECT COUNT(*) FROM Files WHERE {date} AND {pictures}",
+    # Number of pictures in the group that are displayed before the picture bound first
+    "offset": "SELECT COUNT(*) FROM Files,"
+              " (SELECT ImageDateTime AS selectedDateTime, strFilename AS selectedFilename FROM Files WHERE idFile = ?) AS Selected"
+              " WHERE {date} AND {pictures}"
+              " AND (ImageDateTime < selectedDateTime OR (ImageDateTime = selectedDateTime AND strFilename < selectedFilename))",
+    # The pictures of the group in the order they are displayed, bound to the LIMIT and the OFFSET last
+    "pictures": "SELECT idFile, {imgdatetime}, strPath, strFilename FROM Files WHERE {date} AND {pictures}"
+                " ORDER BY ImageDateTime, strFilename LIMIT ? OFFSET ?"}
+
+STATEMENTS = {
+    # Cheap summary of the Files table that changes when pictures are added or removed
+    "fingerprint": "Select COUNT(*), MAX(idFile) FROM Files",
+    "id_range": "Select MIN(idFile), MAX(idFile) FROM Files",
+    "filter_names": "Select strFilterName FROM FilterWizard",
+    "filter_id": "Select pkFilter FROM FilterWizard WHERE strFilterName = ?",
+    "filter": "Select * FROM FilterWizard WHERE pkFilter = ?",
+    "filter_items": "Select * FROM FilterWizardItems WHERE fkFilter = ? ORDER BY 1",
+    "dates": "Select DISTINCT {imgdate} FROM Files WHERE ImageDateTime IS NOT NULL AND ImageDateTime != ''",
+    # Dates of the pictures from the idFile bound to it on
+    "dates_from": "Select {imgdate}, strFilename FROM Files"
+                  " WHERE idFile >= ? AND ImageDateTime IS NOT NULL AND ImageDateTime != ''"
+                  " ORDER BY idFile LIMIT 20",
+    "selection_index": "Select idFile, {imgdatetime}, strFilename FROM Files"
+                       " WHERE ImageDateTime IS NOT NULL AND ImageDateTime != ''"
+                       " ORDER BY ImageDateTime, strFilename",
+    "timeline": "Select idFile, {imgdatetime} FROM Files"
+                " WHERE ImageDateTime IS NOT NULL AND ImageDateTime != '' AND {pictures}"
+                " ORDER BY ImageDateTime, strFilename",
+    "hash_pictures": "Select idFile, mtime, strPath, strFilename FROM Files WHERE {pictures}",
+    # Bound to a batch of idFile numbers
+    "pictures": "SELECT idFile, {imgdatetime}, strPath, strFilename FROM Files WHERE idFile IN ({ids})",
+    # Bound to a batch of (folder, file) pairs
+    "resolve": "Select idFile, {imgdatetime}, strPath, strFilename FROM Files WHERE {pairs}",
+    # Bound to a batch of TagType names
+    "tag_types": "Select idTagType, TagType FROM TagTypes WHERE TagType IN ({tag_types})",
+    # Bound to a batch of idFile numbers and then a batch of idTagType numbers.
+    # CROSS JOIN makes sqlite start with the pictures: with a whole batch of idFile numbers it would otherwise read
+    # every tag of the tag types first. For mysql it is the same as JOIN.
+    "tags": "SELECT TagsInFiles.idFile, TagContents.idTagType, TagContents.TagContent"
+            " FROM TagsInFiles CROSS JOIN TagContents ON TagContents.idTagContent = TagsInFiles.idTagContent"
+            " WHERE TagsInFiles.idFile IN ({ids}) AND TagContents.idTagType IN ({tag_types})",
+    # Bound to the name of the index
+    "date_index_exists": {"mysql" :"SELECT COUNT(*) FROM information_schema.statistics"
+                                   " WHERE table_schema = DATABASE() AND table_name = 'Files' AND index_name = ?",
+                          "sqlite":"SELECT COUNT(*) FROM sqlite_master WHERE type = 'index' AND name = ?"}}
+# Each date group statement with either condition, e.g. date_count and range_count
+for (name, template) in DATE_GROUP_STATEMENTS.items():
+    STATEMENTS["date_" + name] = template.replace("{date}", DATE_CONDITION)
+    STATEMENTS["range_" + name] = template.replace("{date}", RANGE_CONDITION)
+
+def _parameters(count):
+    return ", ".join("?" * count)
+
+# The text of each statement for each backend, made on first use
+_texts = {}
+
+def get(name, db_backend):
+    # The text of the statement called name for db_backend
+    text = _texts.get((name, db_backend))
+    if text is None:
+        template = STATEMENTS[name]
+        if isinstance(template, dict):
+            template = template[db_backend]
+        text = template.format(imgdate=IMGDATE[db_backend],
+                               imgdatetime=IMGDATETIME[db_backend],
+                               pictures=PICTURE_CONDITION,
+                               ids=_parameters(ID_BATCH_SIZE),
+                               tag_types=_parameters(TAG_TYPE_BATCH_SIZE),
+                               pairs=" OR ".join(["(strPath = ? AND strFilename = ?)"] * PAIR_BATCH_SIZE))
+        _texts[(name, db_backend)] = text
+    return text
+
+def padded(values, size):
+    # A tuple of size values, padded with None, which matches nothing
+    values = tuple(values)
+    return values + (None,) * (size - len(values))
+
+def batches(values, size):
+    # Split values into tuples of size values, the last one padded
+    values = list(values)
+    return [padded(values[start:start + size], size) for start in range(0, len(values), size)]
+
+def pair_batches(pairs):
+    # Split (folder, file) pairs into the parameters of the resolve statement
+    return [sum((tuple(pair) if pair is not None else (None, None) for pair in batch), ())
+            for batch in batches(pairs, PAIR_BATCH_SIZE)]
@@ -0,0 +1,103 @@
+# *  This Program is free software; you can redistribute it and/or modify
+# *  it under the terms of the GNU General Public License as published by
+# *  the Free Software Foundation; either version 2, or (at your option)
+# *  any later version.
+# *
+# *  This Program is distributed in the hope that it will be useful,
+# *  but WITHOUT ANY WARRANTY; without even the implied warranty of
+# *  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# *  GNU General Public License for more details.
+# *
+# *  You should have received a copy of the GNU General Public License
+# *  along with Kodi; see the file COPYING.  If not, write to
+# *  the Free Software Foundation, 675 Mass Ave, Cambridge, MA 02139, USA.
+# *  http://www.gnu.org/copyleft/gpl.html
+
+# Timeline of all of the displayable pictures, kept in memory while the screensaver runs.
+# The pictures are sorted by the time they were taken, and split into groups either by the date they
+# were taken or into events: pictures taken no more than a number of seconds apart belong to the same
+# event, so a trip or a party that goes on after midnight is not split in two.
+# Once built, finding a group, the burst a picture is part of or the place of a picture that matched
+# a filter is a binary search, without any queries.
+
+import bisect
+from array import array
+
+SECONDS_PER_DAY = 86400
+
+class Timeline(object):
+    def __init__(self):
+        # Epoch seconds and idFile of each picture, in display order
+        self.epochs = array('q')
+        self.image_ids = array('q')
+        # Position of the first picture of each group
+        self.group_starts = array('q')
+        # Positions of the first and after the last picture of each burst
+        self.burst_starts = array('q')
+        self.burst_ends = array('q')
+        # idFile of each picture sorted by idFile, and the position of each of them in the timeline
+        self.sorted_ids = array('q')
+        self.sorted_positions = array('q')
+
+    def __len__(self):
+        return len(self.epochs)
+
+    def append(self, epoch, image_id):
+        # Add a picture, pictures must be added in display order
+        self.epochs.append(epoch)
+        self.image_ids.append(image_id)
+
+    def finish(self, event_gap, burst_gap, burst_pictures):
+        # Split the pictures into groups and find the bursts, once all of the pictures have been added.
+        # Without an event_gap the pictures are grouped by date, otherwise a gap of more than
+        # event_gap seconds starts a new event.
+        epochs = self.epochs
+        burst_start = 0
+        for position in range(len(epochs)):
+            if position == 0:
+                self.group_starts.append(0)
+                continue
+            gap = epochs[position] - epochs[position - 1]
+            if event_gap is None:
+                if epochs[position] // SECONDS_PER_DAY != epochs[position - 1] // SECONDS_PER_DAY:
+                    self.group_starts.append(position)
+            elif gap > event_gap:
+                self.group_starts.append(position)
+            if gap > burst_gap:
+                self._add_burst(burst_start, position, burst_pictures)
+                burst_start = position
+        self._add_burst(burst_start, len(epochs), burst_pictures)
+        order = sorted(range(len(self.image_ids)), key=self.image_ids.__getitem__)
+        self.sorted_ids = array('q', [self.image_ids[position] for position in order])
+        self.sorted_positions = array('q', order)
+
+    def _add_burst(self, start, end, burst_pictures):
+        if end - start >= burst_pictures:
+            self.burst_starts.append(start)
+            self.burst_ends.append(end)
+
+    def group_count(self):
+        return len(self.group_starts)
+
+    def group_range(self, number):
+        # (first position, position after the last picture) of a group
+        end = self.group_starts[number + 1] if number + 1 < len(self.group_starts) else len(self.epochs)
+        return (self.group_starts[number], end)
+
+    def group_at(self, position):
+        # The range of the group that the picture at position is part of
+        return self.group_range(bisect.bisect_right(self.group_starts, position) - 1)
+
+    def position(self, image_id):
+        # The position of a picture, or None if it is not in the timeline
+        index = bisect.bisect_left(self.sorted_ids, image_id)
+        if index < len(self.sorted_ids) and self.sorted_ids[index] == image_id:
+            return self.sorted_positions[index]
+        return None
+
+    def burst_at(self, position):
+        # The (start, end) of the burst that the picture at position is part of, or None
+        index = bisect.bisect_right(self.burst_starts, position) - 1
+        if index >= 0 and position < self.burst_ends[index]:
+            return (self.burst_starts[index], self.burst_ends[index])
+        return None
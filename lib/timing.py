@@ -0,0 +1,75 @@
+# *  This Program is free software; you can redistribute it and/or modify
+# *  it under the terms of the GNU General Public License as published by
+# *  the Free Software Foundation; either version 2, or (at your option)
+# *  any later version.
+# *
+# *  This Program is distributed in the hope that it will be useful,
+# *  but WITHOUT ANY WARRANTY; without even the implied warranty of
+# *  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# *  GNU General Public License for more details.
+# *
+# *  You should have received a copy of the GNU General Public License
+# *  along with Kodi; see the file COPYING.  If not, write to
+# *  the Free Software Foundation, 675 Mass Ave, Cambridge, MA 02139, USA.
+# *  http://www.gnu.org/copyleft/gpl.html
+
+# Timings of the phases of the slideshow (queries, preparing groups, setting images, waiting, ...).
+# The most recent durations of each phase are kept, so the p50/p95/max of each phase show where
+# the time between slides goes. When disabled, start() and stop() return right away.
+
+import math
+import threading
+import time
+from collections import deque
+
+# Number of recent durations kept for each phase
+WINDOW = 200
+
+class PhaseTimer(object):
+    def __init__(self, enabled, window=WINDOW):
+        self.enabled = enabled
+        self.window = window
+        self.lock = threading.Lock()
+        # phase -> most recent durations in milliseconds
+        self.samples = {}
+        # phase -> number of times the phase has been timed
+        self.counts = {}
+
+    def start(self):
+        # Returns the start time to pass to stop()
+        if not self.enabled:
+            return 0
+        return time.perf_counter()
+
+    def stop(self, phase, started):
+        if not self.enabled:
+            return
+        self.add(phase, (time.perf_counter() - started) * 1000.0)
+
+    def add(self, phase, value):
+        # Record a value that is not a duration, e.g. the number of queries of a group
+        if not self.enabled:
+            return
+        with self.lock:
+            if phase not in self.samples:
+                self.samples[phase] = deque(maxlen=self.window)
+                self.counts[phase] = 0
+            self.samples[phase].append(value)
+            self.counts[phase] += 1
+
+    def summary(self):
+        # phase -> (count, p50, p95, max) of the recent values of each phase
+        with self.lock:
+            samples = dict((phase, sorted(values)) for (phase, values) in self.samples.items())
+            counts = dict(self.counts)
+        return dict((phase, (counts[phase], percentile(values, 50), percentile(values, 95), values[-1]))
+                    for (phase, values) in samples.items() if len(values) > 0)
+
+    def summary_lines(self):
+        return ['%-10s n=%-6d p50=%8.1f p95=%8.1f max=%8.1f' %((phase,) + values)
+                for (phase, values) in sorted(self.summary().items())]
+
+def percentile(sorted_values, percent):
+    # Nearest-rank percentile of a sorted list
+    rank = max(int(math.ceil(percent / 100.0 * len(sorted_values))) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]